@@ -0,0 +1,655 @@
+"""
+Technology Knowledge Base
+
+Canonical facts (aliases, category, pros/cons, logo key) for popular technologies.
+The stack model only has to pick technologies and write the context-specific "why";
+generic pros/cons are filled in from this index after parsing, which keeps
+generations shorter.
+
+Logo keys MUST match the keys in frontend/lib/techLogos.ts.
+"""
+import re
+
+# 1. Canonical Technology Facts
+TECH_KNOWLEDGE_BASE = [
+    # Frontend
+    {
+        "name": "React",
+        "aliases": ["React.js", "ReactJS"],
+        "category": "frontend",
+        "logo": "React",
+        "pros": [
+            "Largest frontend ecosystem and hiring pool",
+            "Reusable component model speeds up UI development",
+            "Works with most hosting platforms and backends",
+        ],
+        "cons": [
+            "Only a view library - routing, data fetching and state need extra libraries",
+            "Client-side rendering hurts SEO without a framework like Next.js",
+        ],
+    },
+    {
+        "name": "Next.js",
+        "aliases": ["NextJS", "Next"],
+        "category": "frontend",
+        "logo": "Next.js",
+        "pros": [
+            "Server-side rendering and static generation built in - good SEO and first load",
+            "File-based routing and API routes reduce boilerplate",
+            "First-class deployment on Vercel",
+        ],
+        "cons": [
+            "Server/client component split adds a learning curve",
+            "Some features are tightly coupled to the Vercel platform",
+        ],
+    },
+    {
+        "name": "Vue.js",
+        "aliases": ["Vue", "VueJS", "Vue 3"],
+        "category": "frontend",
+        "logo": "Vue.js",
+        "pros": [
+            "Gentle learning curve with clear documentation",
+            "Official router and state management keep the stack cohesive",
+            "Small bundle size and good runtime performance",
+        ],
+        "cons": [
+            "Smaller ecosystem and hiring pool than React",
+            "Fewer enterprise-scale reference projects",
+        ],
+    },
+    {
+        "name": "Angular",
+        "aliases": ["AngularJS", "Angular 2+"],
+        "category": "frontend",
+        "logo": "Angular",
+        "pros": [
+            "Batteries-included framework (routing, forms, HTTP, DI)",
+            "Strong conventions suit large teams and long-lived codebases",
+            "TypeScript-first with solid tooling",
+        ],
+        "cons": [
+            "Steep learning curve and verbose boilerplate",
+            "Heavier bundles than lighter frameworks",
+        ],
+    },
+    {
+        "name": "Svelte",
+        "aliases": ["SvelteKit", "Svelte Kit"],
+        "category": "frontend",
+        "logo": "Svelte",
+        "pros": [
+            "Compiles away the framework - very small, fast bundles",
+            "Minimal boilerplate makes development quick",
+        ],
+        "cons": [
+            "Smaller ecosystem and community than React or Vue",
+            "Harder to hire experienced developers",
+        ],
+    },
+    {
+        "name": "TypeScript",
+        "aliases": ["TS"],
+        "category": "frontend",
+        "logo": "TypeScript",
+        "pros": [
+            "Static typing catches bugs before runtime",
+            "Better editor autocompletion and refactoring",
+        ],
+        "cons": [
+            "Extra build step and type maintenance overhead",
+        ],
+    },
+    {
+        "name": "Tailwind CSS",
+        "aliases": ["Tailwind", "TailwindCSS"],
+        "category": "frontend",
+        "logo": "Tailwind CSS",
+        "pros": [
+            "Utility classes make styling fast and consistent",
+            "Unused styles are purged - tiny production CSS",
+        ],
+        "cons": [
+            "Markup becomes verbose with many class names",
+            "Team needs to learn the utility naming conventions",
+        ],
+    },
+    # Backend
+    {
+        "name": "Node.js",
+        "aliases": ["Node", "NodeJS"],
+        "category": "backend",
+        "logo": "Node.js",
+        "pros": [
+            "Same language (JavaScript/TypeScript) on frontend and backend",
+            "Non-blocking I/O handles many concurrent connections",
+            "Huge npm package ecosystem",
+        ],
+        "cons": [
+            "Single-threaded - CPU-heavy work blocks the event loop",
+            "Dependency sprawl increases supply-chain risk",
+        ],
+    },
+    {
+        "name": "Express",
+        "aliases": ["Express.js", "ExpressJS"],
+        "category": "backend",
+        "logo": "Express",
+        "pros": [
+            "Minimal and unopinionated - quick to get an API running",
+            "Mature middleware ecosystem",
+        ],
+        "cons": [
+            "No built-in structure - large codebases need their own conventions",
+            "Validation, auth and docs must be added manually",
+        ],
+    },
+    {
+        "name": "FastAPI",
+        "aliases": ["Fast API"],
+        "category": "backend",
+        "logo": "FastAPI",
+        "pros": [
+            "Automatic OpenAPI documentation from type hints",
+            "Async support with high throughput for Python",
+            "Pydantic validation built in",
+        ],
+        "cons": [
+            "Younger ecosystem than Django or Flask",
+            "No built-in admin panel or ORM",
+        ],
+    },
+    {
+        "name": "Django",
+        "aliases": ["Django REST Framework", "DRF"],
+        "category": "backend",
+        "logo": "Django",
+        "pros": [
+            "Batteries included - ORM, admin, auth and migrations out of the box",
+            "Mature, secure defaults and a large community",
+        ],
+        "cons": [
+            "Heavier and more opinionated than micro-frameworks",
+            "Async support is still partial across the ecosystem",
+        ],
+    },
+    {
+        "name": "Python",
+        "aliases": [],
+        "category": "backend",
+        "logo": "Python",
+        "pros": [
+            "Readable syntax and fast development",
+            "Best-in-class AI/ML and data libraries",
+        ],
+        "cons": [
+            "Slower raw performance than compiled languages",
+            "GIL limits CPU-bound multithreading",
+        ],
+    },
+    {
+        "name": "Go",
+        "aliases": ["Golang"],
+        "category": "backend",
+        "logo": "Go",
+        "pros": [
+            "Compiled, fast and memory efficient",
+            "Goroutines make concurrency simple",
+            "Single static binary simplifies deployment",
+        ],
+        "cons": [
+            "More verbose error handling",
+            "Smaller web framework ecosystem than Node.js or Python",
+        ],
+    },
+    {
+        "name": "Spring Boot",
+        "aliases": ["Spring", "Java Spring"],
+        "category": "backend",
+        "logo": "Spring Boot",
+        "pros": [
+            "Enterprise-grade ecosystem for security, data and messaging",
+            "Strong typing and mature tooling on the JVM",
+        ],
+        "cons": [
+            "Higher memory footprint and slower startup",
+            "Verbose configuration and steeper learning curve",
+        ],
+    },
+    {
+        "name": "Rust",
+        "aliases": ["Actix", "Axum"],
+        "category": "backend",
+        "logo": "Rust",
+        "pros": [
+            "C-level performance with memory safety",
+            "Very low and predictable resource usage",
+        ],
+        "cons": [
+            "Steep learning curve slows early development",
+            "Smaller hiring pool and web ecosystem",
+        ],
+    },
+    {
+        "name": "GraphQL",
+        "aliases": ["Apollo GraphQL", "Apollo"],
+        "category": "backend",
+        "logo": "GraphQL",
+        "pros": [
+            "Clients fetch exactly the data they need in one request",
+            "Strongly typed schema doubles as API documentation",
+        ],
+        "cons": [
+            "Caching and rate limiting are harder than with REST",
+            "N+1 query problems need dataloaders",
+        ],
+    },
+    # Database
+    {
+        "name": "PostgreSQL",
+        "aliases": ["Postgres", "Postgres SQL", "PostgresSQL"],
+        "category": "database",
+        "logo": "PostgreSQL",
+        "pros": [
+            "Reliable ACID relational database with rich SQL features",
+            "JSONB, full-text search and extensions cover many use cases",
+            "Available as a managed service on every major cloud",
+        ],
+        "cons": [
+            "Horizontal write scaling needs extra tooling",
+            "Requires schema design and SQL knowledge",
+        ],
+    },
+    {
+        "name": "MySQL",
+        "aliases": ["MariaDB"],
+        "category": "database",
+        "logo": "MySQL",
+        "pros": [
+            "Widely supported relational database with simple operations",
+            "Fast reads for typical web workloads",
+        ],
+        "cons": [
+            "Fewer advanced features than PostgreSQL",
+            "Horizontal scaling needs sharding or replicas",
+        ],
+    },
+    {
+        "name": "MongoDB",
+        "aliases": ["Mongo", "MongoDB Atlas"],
+        "category": "database",
+        "logo": "MongoDB",
+        "pros": [
+            "Flexible document schema for fast iteration",
+            "Built-in horizontal scaling with sharding",
+        ],
+        "cons": [
+            "Weaker support for complex joins and transactions",
+            "Schema flexibility can lead to inconsistent data",
+        ],
+    },
+    {
+        "name": "Redis",
+        "aliases": ["Redis Cache", "Upstash Redis"],
+        "category": "database",
+        "logo": "Redis",
+        "pros": [
+            "In-memory store with sub-millisecond latency",
+            "Versatile - caching, sessions, queues and pub/sub",
+        ],
+        "cons": [
+            "Memory-bound - large datasets get expensive",
+            "Persistence is limited compared to a primary database",
+        ],
+    },
+    {
+        "name": "Supabase",
+        "aliases": ["Supabase Postgres"],
+        "category": "database",
+        "logo": "Supabase",
+        "pros": [
+            "Managed PostgreSQL with auth, storage and realtime included",
+            "Generous free tier for MVPs",
+        ],
+        "cons": [
+            "Vendor-specific features increase lock-in",
+            "Less control over database tuning than self-hosting",
+        ],
+    },
+    {
+        "name": "Firebase",
+        "aliases": ["Firestore", "Google Firebase"],
+        "category": "database",
+        "logo": "Firebase",
+        "pros": [
+            "Realtime sync, auth and hosting with no backend to manage",
+            "Very fast to prototype",
+        ],
+        "cons": [
+            "Limited querying compared to SQL databases",
+            "Costs grow quickly with read-heavy workloads",
+        ],
+    },
+    {
+        "name": "DynamoDB",
+        "aliases": ["Amazon DynamoDB", "AWS DynamoDB"],
+        "category": "database",
+        "logo": "DynamoDB",
+        "pros": [
+            "Fully managed with predictable single-digit millisecond latency",
+            "Scales automatically to very high throughput",
+        ],
+        "cons": [
+            "Access patterns must be designed up front",
+            "Strong AWS lock-in",
+        ],
+    },
+    {
+        "name": "Cassandra",
+        "aliases": ["Apache Cassandra", "ScyllaDB"],
+        "category": "database",
+        "logo": "Cassandra",
+        "pros": [
+            "Linear write scalability across data centers",
+            "No single point of failure",
+        ],
+        "cons": [
+            "Query model is restrictive and needs careful data modeling",
+            "Operationally complex to run",
+        ],
+    },
+    {
+        "name": "Elasticsearch",
+        "aliases": ["Elastic", "OpenSearch"],
+        "category": "database",
+        "logo": "Elasticsearch",
+        "pros": [
+            "Fast full-text search and aggregations",
+            "Scales horizontally for large indexes",
+        ],
+        "cons": [
+            "Resource hungry and complex to operate",
+            "Not suitable as a primary source of truth",
+        ],
+    },
+    # DevOps/Infrastructure
+    {
+        "name": "Docker",
+        "aliases": ["Docker Compose"],
+        "category": "devops",
+        "logo": "Docker",
+        "pros": [
+            "Consistent environments from development to production",
+            "Portable across every cloud provider",
+        ],
+        "cons": [
+            "Adds image build and registry management overhead",
+        ],
+    },
+    {
+        "name": "Kubernetes",
+        "aliases": ["K8s", "EKS", "AKS", "GKE"],
+        "category": "devops",
+        "logo": "Kubernetes",
+        "pros": [
+            "Automatic scaling, self-healing and rolling deployments",
+            "Industry standard for running containers at scale",
+        ],
+        "cons": [
+            "High operational complexity for small teams",
+            "Overkill and costly for MVP-scale workloads",
+        ],
+    },
+    {
+        "name": "AWS",
+        "aliases": ["Amazon Web Services"],
+        "category": "devops",
+        "logo": "AWS",
+        "pros": [
+            "Broadest catalog of managed services",
+            "Global regions and mature security/compliance certifications",
+        ],
+        "cons": [
+            "Complex pricing and console",
+            "Easy to over-engineer and overspend",
+        ],
+    },
+    {
+        "name": "Azure",
+        "aliases": ["Microsoft Azure"],
+        "category": "devops",
+        "logo": "Azure",
+        "pros": [
+            "Strong enterprise and Microsoft ecosystem integration",
+            "Broad compliance certifications",
+        ],
+        "cons": [
+            "Service naming and documentation can be confusing",
+        ],
+    },
+    {
+        "name": "Google Cloud",
+        "aliases": ["GCP", "Google Cloud Platform"],
+        "category": "devops",
+        "logo": "Google Cloud",
+        "pros": [
+            "Excellent data, analytics and Kubernetes offerings",
+            "Simple, competitive pricing for many services",
+        ],
+        "cons": [
+            "Smaller managed-service catalog than AWS",
+        ],
+    },
+    {
+        "name": "Vercel",
+        "aliases": [],
+        "category": "devops",
+        "logo": "Vercel",
+        "pros": [
+            "Git-push deployments with preview URLs",
+            "Global edge network and free tier for small projects",
+        ],
+        "cons": [
+            "Costs rise quickly at high bandwidth",
+            "Limited for long-running backend workloads",
+        ],
+    },
+    {
+        "name": "Netlify",
+        "aliases": [],
+        "category": "devops",
+        "logo": "Netlify",
+        "pros": [
+            "Simple static and JAMstack hosting with git deployments",
+            "Free tier covers small projects",
+        ],
+        "cons": [
+            "Serverless functions are limited for heavy backend logic",
+        ],
+    },
+    {
+        "name": "Heroku",
+        "aliases": [],
+        "category": "devops",
+        "logo": "Heroku",
+        "pros": [
+            "Very simple PaaS deployments",
+            "Managed add-ons for databases and caching",
+        ],
+        "cons": [
+            "Expensive compared to raw cloud resources at scale",
+            "No free tier",
+        ],
+    },
+    {
+        "name": "GitHub Actions",
+        "aliases": ["GitHub CI"],
+        "category": "devops",
+        "logo": "GitHub Actions",
+        "pros": [
+            "CI/CD integrated directly with the repository",
+            "Large marketplace of reusable actions",
+        ],
+        "cons": [
+            "Paid minutes needed for heavy pipelines on private repos",
+        ],
+    },
+    {
+        "name": "Terraform",
+        "aliases": ["OpenTofu"],
+        "category": "devops",
+        "logo": "Terraform",
+        "pros": [
+            "Infrastructure as code across multiple clouds",
+            "Reviewable, reproducible infrastructure changes",
+        ],
+        "cons": [
+            "State management adds operational overhead",
+        ],
+    },
+    {
+        "name": "Nginx",
+        "aliases": ["NGINX"],
+        "category": "devops",
+        "logo": "Nginx",
+        "pros": [
+            "High-performance reverse proxy and static file server",
+            "Handles TLS termination and load balancing",
+        ],
+        "cons": [
+            "Configuration syntax has a learning curve",
+        ],
+    },
+    # Additional Services
+    {
+        "name": "Kafka",
+        "aliases": ["Apache Kafka", "Confluent"],
+        "category": "additional",
+        "logo": "Kafka",
+        "pros": [
+            "High-throughput, durable event streaming",
+            "Replayable log enables event-driven architectures",
+        ],
+        "cons": [
+            "Complex to operate and tune",
+            "Overkill for simple background jobs",
+        ],
+    },
+    {
+        "name": "RabbitMQ",
+        "aliases": ["Rabbit MQ"],
+        "category": "additional",
+        "logo": "RabbitMQ",
+        "pros": [
+            "Reliable message queue with flexible routing",
+            "Easy to run and well supported by client libraries",
+        ],
+        "cons": [
+            "Lower throughput than log-based systems like Kafka",
+        ],
+    },
+    {
+        "name": "Prometheus",
+        "aliases": [],
+        "category": "additional",
+        "logo": "Prometheus",
+        "pros": [
+            "Standard open-source metrics collection and alerting",
+            "Powerful PromQL query language",
+        ],
+        "cons": [
+            "Not built for long-term metric storage without extra components",
+        ],
+    },
+    {
+        "name": "Grafana",
+        "aliases": [],
+        "category": "additional",
+        "logo": "Grafana",
+        "pros": [
+            "Flexible dashboards over many data sources",
+            "Free open-source and managed cloud options",
+        ],
+        "cons": [
+            "Dashboards need ongoing maintenance",
+        ],
+    },
+]
+
+# 2. Name Normalization & Index
+def normalize_tech_name(name: str) -> str:
+    """
+    Normalize a technology name for index lookups (case, emoji, punctuation)
+    """
+    name = name.lower().strip()
+    # Drop parenthetical notes, e.g. "PostgreSQL (via Supabase)"
+    name = re.sub(r'\(.*?\)', '', name)
+    # Keep only characters that can appear in a tech name
+    name = re.sub(r'[^a-z0-9.+#]+', ' ', name)
+    return ' '.join(name.split()).rstrip('.')
+
+def build_index(entries: list[dict]) -> dict[str, dict]:
+    """
+    Build a lookup index mapping every normalized name and alias to its entry
+    """
+    index = {}
+    for entry in entries:
+        for key in [entry["name"], *entry["aliases"]]:
+            index.setdefault(normalize_tech_name(key), entry)
+    return index
+
+TECH_INDEX = build_index(TECH_KNOWLEDGE_BASE)
+
+def lookup_tech(name: str) -> dict | None:
+    """
+    Return the canonical knowledge base entry for a technology name, or None
+    """
+    return TECH_INDEX.get(normalize_tech_name(name))
+
+# 3. Enrichment of Parsed Responses
+def enrich_tech_item(item) -> bool:
+    """
+    Fill empty pros/cons and the logo key of a TechItem from the knowledge base.
+    Context-specific fields written by the LLM are never overwritten.
+    Returns True if the item was found in the index.
+    """
+    entry = lookup_tech(item.name)
+    if not entry:
+        return False
+    if not item.pros:
+        item.pros = list(entry["pros"])
+    if not item.cons:
+        item.cons = list(entry["cons"])
+    if not item.logo:
+        item.logo = entry["logo"]
+    return True
+
+def enrich_tech_stack(stack) -> int:
+    """
+    Enrich every TechItem in a TechStack, returns the number of items found in the index
+    """
+    found = 0
+    for category in ("frontend", "backend", "database", "devops", "additional"):
+        for item in getattr(stack, category):
+            if enrich_tech_item(item):
+                found += 1
+    return found
+
+def enrich_recommendation(response) -> int:
+    """
+    Enrich the primary and alternative stacks of a RecommendationResponse
+    """
+    found = enrich_tech_stack(response.primary)
+    for alt_stack in response.alternatives:
+        found += enrich_tech_stack(alt_stack)
+    return found
+
+# 4. Prompt Hint
+def knowledge_base_prompt() -> str:
+    """
+    Instructions telling the stack model it may skip generic pros/cons for known technologies
+    """
+    known_names = ", ".join(entry["name"] for entry in TECH_KNOWLEDGE_BASE)
+    return f"""KNOWN TECHNOLOGIES: {known_names}
+
+To keep the response short: for any technology in the KNOWN TECHNOLOGIES list, you MAY omit the "Pros:" and "Cons:" blocks and write only the "**Tech_Name** - emoji_or_icon" line followed by the "Why:" line. Generic pros/cons for these technologies are filled in automatically. Still write full Pros/Cons/Why for technologies NOT in the list, and ALWAYS write a context-specific "Why:" for every technology. Use the exact names from the list where possible."""
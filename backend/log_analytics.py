@@ -0,0 +1,375 @@
+"""
+Log Analytics
+
+Streams the JSONL request logs in LOG_DIR through a generator pipeline (never loading
+a whole file) and computes aggregates: response-length distribution, input-field
+frequencies, parse-failure rates and latency percentiles (generated responses and
+cache hits reported separately).
+
+Logs can optionally be exported to a Parquet snapshot (requires `pyarrow`), which is
+much faster to re-query on multi-GB logs; analysis accepts either format.
+
+Usage:
+    python log_analytics.py                                  # all *_responses.jsonl in logs/
+    python log_analytics.py logs/stack_recommendation_responses.jsonl --mmap
+    python log_analytics.py --json --top 5
+    python log_analytics.py logs/stack_recommendation_responses.jsonl --export-parquet snapshot.parquet
+    python log_analytics.py snapshot.parquet
+"""
+import argparse
+import json
+import math
+import mmap
+import sys
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from recommendation_cache import REQUEST_FIELDS
+
+LOG_DIR = Path("logs")
+
+# Upper bounds (in characters) of the response-length histogram buckets
+LENGTH_BUCKETS = [1000, 2500, 5000, 7500, 10000, 15000, 20000, 30000]
+
+PERCENTILES = [50, 90, 95, 99]
+
+# 1. Streaming Readers
+def iter_lines(path: Path, use_mmap: bool = False) -> Iterator[bytes]:
+    """
+    Yield raw lines from a file, optionally through a memory map
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            if path.stat().st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for line in iter(mm.readline, b""):
+                    yield line
+        else:
+            yield from f
+
+def iter_jsonl_records(lines: Iterable[bytes], errors: Counter | None = None) -> Iterator[dict]:
+    """
+    Decode JSON lines, skipping (and counting) malformed ones
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            if errors is not None:
+                errors["malformed_lines"] += 1
+
+def iter_parquet_records(path: Path, batch_size: int = 10000) -> Iterator[dict]:
+    """
+    Yield records from a Parquet snapshot written by export_parquet
+    """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        for row in batch.to_pylist():
+            yield unflatten_record(row)
+
+def iter_records(path: Path, use_mmap: bool = False, errors: Counter | None = None) -> Iterator[dict]:
+    """
+    Yield log records from a JSONL log or a Parquet snapshot
+    """
+    if path.suffix == ".parquet":
+        yield from iter_parquet_records(path)
+    else:
+        yield from iter_jsonl_records(iter_lines(path, use_mmap), errors)
+
+# 2. Record Flattening (for columnar export)
+def flatten_record(record: dict) -> dict:
+    """
+    Flatten a log record into scalar columns
+    """
+    inputs = record.get("inputs") or {}
+    parse_stats = record.get("parse_stats") or {}
+    stream_guard = record.get("stream_guard") or {}
+    row = {
+        "timestamp": record.get("timestamp"),
+        "model_type": record.get("model_type"),
+        "response_length": record.get("response_length"),
+        "latency_ms": record.get("latency_ms"),
+        "cache_hit": bool(record.get("cache_hit", False)),
+        "has_parse_stats": bool(parse_stats),
+        "has_diagram": parse_stats.get("has_diagram"),
+        "primary_techs": parse_stats.get("primary_techs"),
+        "alternatives": parse_stats.get("alternatives"),
+        "stop_reason": stream_guard.get("stop_reason"),
+        "discarded_tokens": stream_guard.get("discarded_tokens"),
+    }
+    for field in REQUEST_FIELDS:
+        value = inputs.get(field)
+        row[f"input_{field}"] = None if value is None else str(value)
+    return row
+
+def unflatten_record(row: dict) -> dict:
+    """
+    Rebuild the subset of a log record used by the aggregators from a flat row
+    """
+    record = {
+        "timestamp": row.get("timestamp"),
+        "model_type": row.get("model_type"),
+        "response_length": row.get("response_length"),
+        "latency_ms": row.get("latency_ms"),
+        "cache_hit": row.get("cache_hit"),
+        "inputs": {field: row.get(f"input_{field}") for field in REQUEST_FIELDS if row.get(f"input_{field}") is not None},
+    }
+    if row.get("has_parse_stats"):
+        record["parse_stats"] = {
+            "has_diagram": row.get("has_diagram"),
+            "primary_techs": row.get("primary_techs"),
+            "alternatives": row.get("alternatives"),
+        }
+    if row.get("stop_reason"):
+        record["stream_guard"] = {"stop_reason": row.get("stop_reason"), "discarded_tokens": row.get("discarded_tokens")}
+    return record
+
+def export_parquet(records: Iterable[dict], output: Path, batch_size: int = 10000) -> int:
+    """
+    Stream records into a Parquet file in batches, returns the number of rows written
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+    schema = pa.schema(
+        [
+            ("timestamp", pa.string()),
+            ("model_type", pa.string()),
+            ("response_length", pa.int64()),
+            ("latency_ms", pa.float64()),
+            ("cache_hit", pa.bool_()),
+            ("has_parse_stats", pa.bool_()),
+            ("has_diagram", pa.bool_()),
+            ("primary_techs", pa.int64()),
+            ("alternatives", pa.int64()),
+            ("stop_reason", pa.string()),
+            ("discarded_tokens", pa.int64()),
+        ]
+        + [(f"input_{field}", pa.string()) for field in REQUEST_FIELDS]
+    )
+
+    total = 0
+    batch = []
+    with pq.ParquetWriter(output, schema) as writer:
+        for record in records:
+            batch.append(flatten_record(record))
+            if len(batch) >= batch_size:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                total += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            total += len(batch)
+    return total
+
+# 3. Streaming Aggregates
+def percentile(sorted_values, pct: float) -> float | None:
+    """
+    Nearest-rank percentile of an already sorted sequence
+    """
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def summarize_values(values: array) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    summary = {
+        "count": len(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": round(sum(ordered) / len(ordered), 2),
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}"] = percentile(ordered, pct)
+    return summary
+
+class LogStats:
+    """
+    Incremental aggregates over a stream of log records (one instance per model_type)
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.cache_hits = 0
+        # Compact numeric storage - a few bytes per record even for millions of lines
+        self.response_lengths = array("l")
+        self.latencies = array("d")  # generated responses
+        self.cache_hit_latencies = array("d")
+        self.length_histogram = Counter()
+        self.field_values = defaultdict(Counter)
+        self.parse = Counter()
+        self.early_stops = Counter()  # StreamGuard stop reason -> count
+        self.discarded_tokens = 0  # generated before an early stop and cut from the response
+
+    def add(self, record: dict):
+        self.records += 1
+        if record.get("cache_hit"):
+            self.cache_hits += 1
+
+        # Cache hits take ~0 ms and generations seconds, so one mixed distribution says nothing about either
+        latency = record.get("latency_ms")
+        if latency is not None:
+            (self.cache_hit_latencies if record.get("cache_hit") else self.latencies).append(float(latency))
+
+        # Cache hits log an empty response, so they would skew the length distribution
+        length = record.get("response_length")
+        if length is not None and not record.get("cache_hit"):
+            self.response_lengths.append(int(length))
+            bucket = next((f"<={b}" for b in LENGTH_BUCKETS if length <= b), f">{LENGTH_BUCKETS[-1]}")
+            self.length_histogram[bucket] += 1
+
+        for field, value in (record.get("inputs") or {}).items():
+            if field == "customConstraints":
+                self.field_values[field]["(set)" if value else "(empty)"] += 1
+                continue
+            # Multi-select values are joined with ", " by the frontend
+            parts = [p.strip() for p in str(value).split(",") if p.strip()]
+            for part in parts or ["(empty)"]:
+                self.field_values[field][part] += 1
+
+        parse_stats = record.get("parse_stats")
+        if parse_stats:
+            self.parse["checked"] += 1
+            if not parse_stats.get("primary_techs"):
+                self.parse["failed"] += 1
+            elif (parse_stats.get("alternatives") or 0) < 3:
+                self.parse["partial"] += 1
+            if not parse_stats.get("has_diagram"):
+                self.parse["missing_diagram"] += 1
+
+        stream_guard = record.get("stream_guard")
+        if stream_guard and stream_guard.get("stop_reason"):
+            self.early_stops[stream_guard["stop_reason"]] += 1
+            self.discarded_tokens += int(stream_guard.get("discarded_tokens") or 0)
+
+    def summary(self, top: int = 10) -> dict:
+        checked = self.parse["checked"]
+        return {
+            "records": self.records,
+            "cache_hit_rate": round(self.cache_hits / self.records, 4) if self.records else None,
+            "response_length": summarize_values(self.response_lengths),
+            "response_length_histogram": {
+                bucket: self.length_histogram[bucket]
+                for bucket in [f"<={b}" for b in LENGTH_BUCKETS] + [f">{LENGTH_BUCKETS[-1]}"]
+                if self.length_histogram[bucket]
+            },
+            "latency_ms": summarize_values(self.latencies),
+            "cache_hit_latency_ms": summarize_values(self.cache_hit_latencies),
+            "parse": {
+                "checked": checked,
+                "failure_rate": round(self.parse["failed"] / checked, 4) if checked else None,
+                "partial_rate": round(self.parse["partial"] / checked, 4) if checked else None,
+                "missing_diagram_rate": round(self.parse["missing_diagram"] / checked, 4) if checked else None,
+            },
+            "early_stop": {
+                "stops": dict(self.early_stops.most_common()),
+                "discarded_tokens": self.discarded_tokens,
+            },
+            "input_frequencies": {
+                field: dict(counter.most_common(top)) for field, counter in self.field_values.items()
+            },
+        }
+
+def analyze(records: Iterable[dict]) -> dict[str, LogStats]:
+    """
+    Consume a record stream and return aggregates grouped by model_type
+    """
+    stats = defaultdict(LogStats)
+    for record in records:
+        stats[record.get("model_type") or "unknown"].add(record)
+    return stats
+
+# 4. Report Formatting
+def format_report(summaries: dict[str, dict], errors: Counter) -> str:
+    lines = []
+    for model_type, summary in summaries.items():
+        lines.append(f"=== {model_type} ({summary['records']} records) ===")
+        if summary["cache_hit_rate"] is not None:
+            lines.append(f"Cache hit rate: {summary['cache_hit_rate']:.1%}")
+
+        for title, key in [("Response length (chars)", "response_length"), ("Latency, generated (ms)", "latency_ms"),
+                           ("Latency, cache hits (ms)", "cache_hit_latency_ms")]:
+            values = summary[key]
+            if values["count"]:
+                pcts = ", ".join(f"p{p}={values[f'p{p}']:.0f}" for p in PERCENTILES)
+                lines.append(f"{title}: n={values['count']} min={values['min']:.0f} mean={values['mean']:.0f} max={values['max']:.0f} {pcts}")
+
+        if summary["response_length_histogram"]:
+            lines.append("Response length histogram:")
+            for bucket, count in summary["response_length_histogram"].items():
+                lines.append(f"  {bucket:>8}: {count}")
+
+        parse = summary["parse"]
+        if parse["checked"]:
+            lines.append(
+                f"Parse: checked={parse['checked']} failure={parse['failure_rate']:.1%} "
+                f"partial={parse['partial_rate']:.1%} missing_diagram={parse['missing_diagram_rate']:.1%}"
+            )
+
+        early_stop = summary["early_stop"]
+        if early_stop["stops"]:
+            reasons = ", ".join(f"{reason}={count}" for reason, count in early_stop["stops"].items())
+            lines.append(f"Early stops: {reasons} (~{early_stop['discarded_tokens']} generated tokens discarded)")
+
+        for field, values in summary["input_frequencies"].items():
+            lines.append(f"{field}:")
+            for value, count in values.items():
+                lines.append(f"  {count:>6}  {value}")
+        lines.append("")
+
+    if errors["malformed_lines"]:
+        lines.append(f"Skipped {errors['malformed_lines']} malformed lines")
+    return "\n".join(lines)
+
+# 5. CLI
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream and aggregate TechStack request logs")
+    parser.add_argument("paths", nargs="*", type=Path,
+                        help="JSONL logs or Parquet snapshots (default: logs/*_responses.jsonl)")
+    parser.add_argument("--mmap", action="store_true", help="Read JSONL files through mmap")
+    parser.add_argument("--top", type=int, default=10, help="Top-N values per input field")
+    parser.add_argument("--json", action="store_true", help="Print aggregates as JSON")
+    parser.add_argument("--export-parquet", type=Path, metavar="OUTPUT",
+                        help="Write the records to a Parquet snapshot instead of analyzing them")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(LOG_DIR.glob("*_responses.jsonl"))
+    if not paths:
+        print(f"No log files found in {LOG_DIR}/", file=sys.stderr)
+        return 1
+
+    errors = Counter()
+    records = (record for path in paths for record in iter_records(path, args.mmap, errors))
+
+    if args.export_parquet:
+        try:
+            total = export_parquet(records, args.export_parquet)
+        except RuntimeError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        print(f"Exported {total} records to {args.export_parquet}")
+        return 0
+
+    summaries = {model_type: stats.summary(args.top) for model_type, stats in analyze(records).items()}
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print(format_report(summaries, errors))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,9 @@
 import os
-import re
 import json
+import hashlib
 from datetime import datetime
 from pathlib import Path
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -14,6 +14,21 @@ from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+# Local Modules
+from knowledge_base import enrich_recommendation, knowledge_base_prompt
+from response_parser import (
+    TechStack, RecommendationResponse,
+    parse_tech_stack_response, split_alternative_sections, parse_alternative_section,
+)
+from recommendation_cache import RecommendationCache, refinement_cache_key, request_cache_key
+from warmup import WarmupScheduler
+from request_metrics import RequestMetrics
+from render_service import RenderService
+from similarity_index import SimilarityRetriever, format_seed, is_equivalent_request
+from refinement import build_refine_prompt, changed_fields, describe_inputs, merge_alternatives, plan_refinement
+from stream_guard import StreamGuard, estimate_tokens
+from tracing import InMemorySpanExporter, JsonlSpanExporter, current_span, current_trace_id, format_trace, tracer
+
 # 1. Load Environment Variables
 load_dotenv()
 
@@ -31,8 +46,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "X-Render-Cache", "traceparent"],  # Lets the frontend read per-stage timings
 )
 
+# Request Tracing: one trace per request, continued from the frontend's traceparent header.
+# Recent traces stay in memory (/api/debug/traces), all traces go to logs/traces.jsonl
+trace_store = InMemorySpanExporter(max_traces=int(os.getenv("TRACE_MEMORY_TRACES", "200")))
+tracer.add_exporter(trace_store)
+trace_file_exporter = None
+if os.getenv("TRACE_EXPORT_FILE", "true").lower() == "true":
+    trace_file_exporter = JsonlSpanExporter(LOG_DIR / "traces.jsonl",
+                                            max_bytes=int(os.getenv("TRACE_FILE_MAX_MB", "50")) * 1024 * 1024)
+    tracer.add_exporter(trace_file_exporter)
+
+def is_traced_request(request: Request) -> bool:
+    # Preflights, the health check and the trace viewer itself would only push real traces out of memory
+    path = request.url.path
+    return request.method != "OPTIONS" and path != "/" and not path.startswith("/api/debug/")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not is_traced_request(request):
+        return await call_next(request)
+    with tracer.start_trace(f"{request.method} {request.url.path}", traceparent=request.headers.get("traceparent"),
+                            **{"http.method": request.method, "http.target": request.url.path}) as span:
+        response = await call_next(request)
+        span.set_attribute("http.status_code", response.status_code)
+        response.headers["traceparent"] = span.traceparent()
+        return response
+
 # 5. Setup Groq Models
 # Model 1: For generating custom prompts based on user inputs
 prompt_engineer_model = ChatGroq(
@@ -42,14 +84,17 @@ prompt_engineer_model = ChatGroq(
 )
 
 # Model 2: For tech stack recommendation (keep conservative)
+# Responses are streamed through a StreamGuard that stops early; max_tokens is the hard cap
+STACK_MAX_TOKENS = int(os.getenv("STACK_MAX_TOKENS", "8000"))
 stack_model = ChatGroq(
     temperature=0.2, 
     model_name="llama-3.1-8b-instant", 
+    max_tokens=STACK_MAX_TOKENS,
     api_key=os.getenv("GROQ_API_KEY")
 )
 
 # 6. Logging Function
-def log_request_response(user_inputs: dict, response: str, model_type: str = "stack", custom_prompt: str = None, master_prompt: str = None):
+def log_request_response(user_inputs: dict, response: str, model_type: str = "stack", custom_prompt: str = None, master_prompt: str = None, cache_hit: bool = False, latency_ms: float = None, parse_stats: dict = None, stream_guard: dict = None):
     """
     Log API requests and responses for learning and analysis
     """
@@ -57,15 +102,20 @@ def log_request_response(user_inputs: dict, response: str, model_type: str = "st
         timestamp = datetime.now().isoformat()
         log_entry = {
             "timestamp": timestamp,
+            "trace_id": current_trace_id(),  # Links the entry to its spans in logs/traces.jsonl
             "model_type": model_type,
             "inputs": user_inputs,
             "master_prompt": master_prompt,  # Store the complete master prompt (custom + system)
             "response_preview": response[:500],  # Store first 500 chars as preview
-            "response_length": len(response)
+            "response_length": len(response),
+            "cache_hit": cache_hit,
+            "latency_ms": latency_ms,
+            "parse_stats": parse_stats,  # Parsed tech/alternative counts, used to compute parse-failure rates
+            "stream_guard": stream_guard  # Early-stop reason and generated tokens discarded after the cut
         }
         
         log_file = LOG_DIR / f"{model_type}_responses.jsonl"
-        with open(log_file, "a") as f:
+        with tracer.span("log.write", model_type=model_type), open(log_file, "a") as f:
             f.write(json.dumps(log_entry) + "\n")
     except Exception as e:
         print(f"Logging error: {e}")
@@ -373,37 +423,51 @@ DO NOT:
 IMPORTANT: After providing the mermaid diagram, ALWAYS include the complete PRIMARY Technology Stack and all sections (Frontend, Backend, Database, DevOps, Additional Services) with pros, cons, and why explanations for each technology.
 """
 
-# Function to extract and validate mermaid code from response
-def process_response_stream(text: str) -> str:
-    """
-    Extract mermaid blocks, validate them, and return cleaned response
-    """
-    # Find mermaid code blocks
-    mermaid_pattern = r'```mermaid\n(.*?)\n```'
-    matches = re.finditer(mermaid_pattern, text, re.DOTALL)
-    
-    cleaned_text = text
-    for match in matches:
-        mermaid_code = match.group(1)
-        is_valid, message = validate_mermaid_syntax(mermaid_code)
-        
-        if not is_valid:
-            # Replace invalid mermaid block with error message
-            cleaned_text = cleaned_text.replace(
-                match.group(0),
-                f"```\n⚠️ Architecture diagram could not be generated.\nReason: {message}\n```"
-            )
-    
-    return cleaned_text
+# System prompt for /api/refine: ONLY the ALTERNATIVE format, since the diagram and PRIMARY stack are
+# already decided. The per-technology format and Mermaid rules are taken from system_prompt above.
+ALTERNATIVE_EXPLANATION_RULES = system_prompt[system_prompt.index("FOR EACH ALTERNATIVE, START WITH AN EXPLANATION:"):system_prompt.index("Use headers like:")]
+TECH_ENTRY_FORMAT = system_prompt[system_prompt.index("### Frontend\n**Tech_Name**"):system_prompt.index("## ALTERNATIVE Technology Stacks")]
+MERMAID_RULES = system_prompt[system_prompt.index("CRITICAL MERMAID SYNTAX RULES"):system_prompt.index("IMPORTANT: After providing the mermaid diagram")]
+
+refine_system_prompt = f"""You are updating an existing tech stack recommendation. The top-level Architecture Diagram and the PRIMARY Technology Stack are already decided: do NOT output them, and NEVER output a "## PRIMARY Technology Stack" header.
+
+Output ONLY the ALTERNATIVE STACK section(s) you are asked for.
+
+{ALTERNATIVE_EXPLANATION_RULES}
+Structure each section EXACTLY as follows:
+## ALTERNATIVE STACK #N
+**When to use this stack:** [explanation]
+**Primary trade-off vs recommended stack:** [trade-off explanation]
+**Why this option is worth considering:** [context-specific reasoning]
+
+### Architecture Diagram
+```mermaid
+[SPECIFIC tech stack diagram for this alternative]
+```
+
+Then the full tech stack, one entry per category in this format:
+
+{TECH_ENTRY_FORMAT}
+{MERMAID_RULES}"""
 
 # LangChain Pipelines
 stack_prompt_template = ChatPromptTemplate.from_messages([
     ("system", system_prompt),
+    ("system", knowledge_base_prompt()),
     ("user", "{custom_prompt}")
 ])
 
 stack_chain = stack_prompt_template | stack_model | StrOutputParser()
 
+# Refinement Prompt Template (same model, alternatives-only system prompt)
+refine_prompt_template = ChatPromptTemplate.from_messages([
+    ("system", refine_system_prompt),
+    ("system", knowledge_base_prompt()),
+    ("user", "{custom_prompt}")
+])
+
+refine_chain = refine_prompt_template | stack_model | StrOutputParser()
+
 # Prompt Engineering Prompt Template
 prompt_engineer_template = ChatPromptTemplate.from_messages([
     ("system", prompt_engineer_system),
@@ -412,26 +476,24 @@ prompt_engineer_template = ChatPromptTemplate.from_messages([
 
 prompt_engineer_chain = prompt_engineer_template | prompt_engineer_model | StrOutputParser()
 
-# 7. Request and Response Models
-class TechItem(BaseModel):
-    name: str
-    pros: list[str] = []
-    cons: list[str] = []
-    why: str = ""
-
-class TechStack(BaseModel):
-    frontend: list[TechItem] = []
-    backend: list[TechItem] = []
-    database: list[TechItem] = []
-    devops: list[TechItem] = []
-    additional: list[TechItem] = []
-
-class RecommendationResponse(BaseModel):
-    architecture_diagram: str
-    primary: TechStack
-    alternatives: list[TechStack] = []
-    alternative_explanations: list[dict] = []  # {stack_num, when_to_use, trade_off, why_consider}
-
+# Prompt version - changes whenever any prompt text changes, so cached responses get refreshed
+PROMPT_VERSION = os.getenv("PROMPT_VERSION") or hashlib.sha256(
+    (prompt_engineer_system + system_prompt + refine_system_prompt + knowledge_base_prompt()).encode("utf-8")
+).hexdigest()[:12]
+
+# Recommendation Cache & Warm-up Settings
+recommendation_cache = RecommendationCache(LOG_DIR / "cache", max_memory_entries=int(os.getenv("CACHE_MEMORY_ENTRIES", "256")),
+                                           ttl_days=float(os.getenv("CACHE_TTL_DAYS", "30")))
+similarity_retriever = SimilarityRetriever()
+SIMILARITY_SEED_THRESHOLD = float(os.getenv("SIMILARITY_SEED_THRESHOLD", "0.85"))
+render_service = RenderService(LOG_DIR / "renders", max_workers=int(os.getenv("RENDER_WORKERS", "2")),
+                               max_cache_bytes=int(os.getenv("RENDER_CACHE_MAX_MB", "200")) * 1024 * 1024)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+WARMUP_TOKEN_BUDGET = int(os.getenv("WARMUP_TOKEN_BUDGET", "200000"))
+WARMUP_OFF_PEAK_HOURS = os.getenv("WARMUP_OFF_PEAK_HOURS", "1-6")
+
+# Request Models (response models live in response_parser.py)
 class StackRequest(BaseModel):
     appType: str
     scale: str
@@ -442,6 +504,10 @@ class StackRequest(BaseModel):
     securityLevel: str = "standard"
     customConstraints: str = ""
 
+class RefineRequest(BaseModel):
+    recommendation_id: str
+    changes: dict[str, str]  # StackRequest field -> new value, e.g. {"budget": "Minimal (<$1K)"}
+
 class PromptGenerationRequest(BaseModel):
     appType: str
     scale: str
@@ -452,430 +518,399 @@ class PromptGenerationRequest(BaseModel):
     securityLevel: str = "standard"
     customConstraints: str = ""
 
-# Mermaid Sanitizer and Validator
-def sanitize_mermaid_code(code: str) -> str:
+
+
+
+def recommendation_parse_stats(parsed: RecommendationResponse) -> dict:
     """
-    Clean up mermaid code to fix common generation issues
+    Summarize how much of the LLM response was successfully parsed (for log analytics)
     """
-    lines = []
-    for line in code.split('\n'):
-        # Strip leading/trailing whitespace
-        line = line.strip()
-        if not line or line.startswith('graph'):
-            if line:
-                lines.append(line)
-            continue
-        
-        # SKIP completely incomplete arrows - these will break mermaid anyway
-        # Skip: A -->|Label| (no target) 
-        if line.endswith('-->|') or line.endswith('-->') or re.search(r'-->\|[^|]*\|?\s*$', line):
-            # Incomplete arrow, skip it
-            continue
-        
-        # Fix unclosed brackets - add closing bracket if needed
-        # Pattern: NodeID[Label without closing bracket (not on arrow lines)
-        if '[' in line and ']' not in line and '-->' not in line:
-            line = line + ']'
-        
-        # For arrow lines with unclosed brackets in target
-        # Pattern: A -->|Label| B[ should become A -->|Label| B[]
-        if '-->' in line and '[' in line and ']' not in line:
-            # Only add bracket if the line ends with an incomplete bracket
-            if line.rstrip().endswith('['):
-                line = line + ']'
-            # But if it has content after bracket that's not valid, skip the line
-            elif not re.search(r'\[[a-zA-Z0-9_]*\]', line):
-                # Can't fix this, skip it
-                continue
-        
-        # Fix spaces in node labels - replace spaces with underscores in brackets
-        # Pattern: NodeID[Label With Spaces] -> NodeID[Label_With_Spaces]
-        line = re.sub(r'(\[)([^\]]+)(\])', 
-                      lambda m: m.group(1) + m.group(2).replace(' ', '_') + m.group(3), 
-                      line)
-        
-        # Fix spaces in arrow labels - replace spaces with underscores
-        # Pattern: -->|Label With Spaces| -> -->|Label_With_Spaces|
-        line = re.sub(r'(\|)([^\|]+)(\|)', 
-                      lambda m: m.group(1) + m.group(2).replace(' ', '_') + m.group(3), 
-                      line)
-        
-        # Verify line is valid after processing
-        # Must have balanced brackets and pipes if this is an arrow
-        if '-->' in line:
-            # Arrow line - must have target node or be removed
-            if not re.search(r'-->\s*[a-zA-Z0-9_]+\[\w*\]', line) and not re.search(r'-->\|[^|]+\|\s*[a-zA-Z0-9_]+', line):
-                # Can't find valid target node, skip this line
-                continue
-        
-        lines.append(line)
-    
-    return '\n'.join(lines)
+    def count(stack: TechStack) -> int:
+        return len(stack.frontend) + len(stack.backend) + len(stack.database) + len(stack.devops) + len(stack.additional)
+    return {
+        "has_diagram": bool(parsed.architecture_diagram),
+        "primary_techs": count(parsed.primary),
+        "alternatives": len(parsed.alternatives),
+        "alternative_techs": [count(alt) for alt in parsed.alternatives],
+    }
 
-def validate_mermaid_syntax(code: str) -> tuple[bool, str]:
+async def stream_stack_response(stack_input: str, metrics: RequestMetrics, guard: StreamGuard, chain=None) -> str:
     """
-    Validate mermaid diagram syntax and return (is_valid, error_message)
+    Stream the stack model's response (stack_chain, or `chain`) through a StreamGuard and stop the generation
+    as soon as the guard has what it needs (or a section runs over its budget).
+    Returns the response text, truncated before any discarded section.
     """
-    if not code or len(code.strip()) < 10:
-        return False, "Code too short"
-    
-    # Sanitize first
-    code = sanitize_mermaid_code(code)
-    lines = code.strip().split('\n')
-    
-    # Check if starts with graph TD
-    if not any('graph TD' in line for line in lines[:3]):
-        return False, "Must start with 'graph TD'"
-    
-    # Check for bracket matching - count brackets per line
-    for line in lines:
-        if line.strip() and not line.strip().startswith('graph'):
-            open_brackets = line.count('[')
-            close_brackets = line.count(']')
-            if open_brackets != close_brackets:
-                return False, f"Unmatched brackets in line: {line[:40]}"
-            
-            open_pipes = line.count('|')
-            if open_pipes > 0 and open_pipes % 2 != 0:
-                return False, f"Unmatched pipes in arrow label: {line[:40]}"
-    
-    # Check for invalid arrow patterns
-    invalid_patterns = [
-        (r'--\.-+', 'Dotted arrows not allowed'),
-        (r'-+\|>', 'Special arrowheads not allowed'),
-        (r'===+>', 'Thick arrows not allowed'),
-        (r'-->+\*', 'Invalid symbols in arrows'),
-        (r'\]\[', 'Consecutive brackets error'),
-        (r'-->\|\s*$', 'Incomplete arrow statement'),
-        (r'-->\|$', 'Missing arrow label target'),
-    ]
-    
-    for pattern, reason in invalid_patterns:
-        if re.search(pattern, code, re.MULTILINE):
-            return False, reason
-    
-    # Check for HTML entities
-    if '&lt;' in code or '&gt;' in code or '&amp;' in code:
-        return False, "HTML entities not allowed"
-    
-    # Check for spaces in node IDs (should be underscores)
-    # Valid: NodeID[Label] or -->|Label_Text|
-    # Invalid: Node ID[Label] or -->|Label Text|
-    if re.search(r'\s+\[', code):
-        return False, "Spaces in node definitions"
-    
-    # Check node definitions exist
-    node_pattern = r'[a-zA-Z0-9_]+\['
-    if not re.search(node_pattern, code):
-        return False, "No valid nodes found"
-    
-    # Check connections exist
-    arrow_pattern = r'-->'
-    if not re.search(arrow_pattern, code):
-        return False, "No valid connections found"
+    stream = (chain or stack_chain).astream({"custom_prompt": stack_input}, config=metrics.callbacks("stack"))
+    try:
+        async for chunk in stream:
+            if guard.feed(chunk):
+                break
+    finally:
+        # Closing the stream closes the provider connection, which ends the generation
+        await stream.aclose()
     
-    return True, code
-
-
-# Parse response into structured format
-def parse_tech_stack_response(response: str) -> RecommendationResponse:
+    if not metrics.tokens.get("stack", {}).get("total_tokens"):
+        # langchain-groq drops the usage of streamed responses, so estimate it from the formatted prompt
+        # messages and the streamed text (flagged as estimated in ?meta, Server-Timing and the cache)
+        prompt_messages = (chain or stack_chain).first.format_messages(custom_prompt=stack_input)
+        prompt_tokens = estimate_tokens("".join(str(message.content) for message in prompt_messages))
+        metrics.record_usage("stack", stack_model.model_name, {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": guard.generated_tokens,
+            "total_tokens": prompt_tokens + guard.generated_tokens,
+        }, estimated=True)
+        current_span().set_attributes({
+            "llm.tokens_estimated": True,
+            "llm.model": stack_model.model_name,
+            "llm.prompt_tokens": prompt_tokens,
+            "llm.completion_tokens": guard.generated_tokens,
+        })
+    metrics.stream_guard = guard.stats()
+    current_span().set_attributes({
+        "guard.stop_reason": guard.stop_reason,
+        "guard.generated_tokens": metrics.stream_guard["generated_tokens"],
+        "guard.discarded_tokens": metrics.stream_guard["discarded_tokens"],
+    })
+    if guard.stopped:
+        print(f"=== BACKEND LOG: Stopped generation early ({guard.stop_reason}), ~{metrics.stream_guard['discarded_tokens']} generated tokens discarded ===")
+    return guard.text
+
+# Full generation pipeline shared by the API and the warm-up scheduler
+async def generate_recommendation(inputs: dict, metrics: RequestMetrics | None = None, seed: str = "") -> tuple[RecommendationResponse, str, str]:
     """
-    Parse the LLM response into a structured RecommendationResponse
+    Run prompt engineering + stack recommendation and parse the result.
+    Stage timings and token usage are recorded on `metrics` if given.
+    `seed` (a similar past recommendation) is appended to the custom prompt as a few-shot hint.
+    Returns (parsed_response, custom_prompt, full_response)
     """
-    print(f"\n=== PARSE START: Response length {len(response)} ===")
-    print(f"First 500 chars:\n{response[:500]}\n")
+    metrics = metrics or RequestMetrics(PROMPT_VERSION)
     
-    # Extract architecture diagram
-    mermaid_match = re.search(r'```mermaid\n(.*?)\n```', response, re.DOTALL)
-    diagram = mermaid_match.group(1) if mermaid_match else ""
+    print("\n=== BACKEND LOG: Generating custom prompt ===")
+    with metrics.stage("prompt_engineer"):
+        custom_prompt = await prompt_engineer_chain.ainvoke({
+            "appType": inputs["appType"],
+            "scale": inputs["scale"],
+            "focus": inputs["focus"],
+            "teamSize": inputs["teamSize"],
+            "budget": inputs["budget"],
+            "timeToMarket": inputs["timeToMarket"],
+            "securityLevel": inputs["securityLevel"],
+            "customConstraints": inputs["customConstraints"]
+        }, config=metrics.callbacks("prompt_engineer"))
+    print(f"Custom prompt generated: {custom_prompt[:200]}...")
     
-    # Extract PRIMARY stack
-    primary_match = re.search(r'## PRIMARY Technology Stack\n(.*?)(?=## ALTERNATIVE|$)', response, re.DOTALL)
-    primary_text = primary_match.group(1) if primary_match else ""
-    print(f"\n=== PRIMARY section length: {len(primary_text)} ===")
-    print(f"PRIMARY first 300 chars:\n{primary_text[:300]}\n")
-    primary_stack = parse_stack_section(primary_text)
+    print("=== BACKEND LOG: Generating tech stack recommendation ===")
+    stack_input = f"{custom_prompt}\n\n{seed}" if seed else custom_prompt
+    with metrics.stage("stack_llm"):
+        full_response = await stream_stack_response(stack_input, metrics, StreamGuard(max_tokens=STACK_MAX_TOKENS))
     
-    # Extract alternatives
-    alternatives = []
-    alternative_explanations = []
-    # Fixed regex: Allow for text after the number in the header (e.g., ": Cost-Effective MVP")
-    alt_pattern = r'## ALTERNATIVE STACK #(\d+)[:\s][^\n]*\n(.*?)(?=## ALTERNATIVE STACK #\d+|$)'
+    print(f"\n=== BACKEND LOG: Full response length: {len(full_response)} ===")
+    print(f"=== BACKEND LOG: PRIMARY check: {'## PRIMARY' in full_response} ===")
+    print(f"=== BACKEND LOG: MERMAID check: {'```mermaid' in full_response} ===")
     
-    # Debug: Check if response contains ALTERNATIVE STACK markers
-    if '## ALTERNATIVE STACK' in response:
-        print("✓ Response contains ALTERNATIVE STACK markers")
-    else:
-        print("✗ Response MISSING ALTERNATIVE STACK markers!")
-        print(f"  Response content preview:\n{response[-500:]}")
+    # Debug: Save raw response to file for inspection
+    with open('last_llm_response.txt', 'w') as f:
+        f.write(full_response)
+    print(f"=== BACKEND LOG: Raw response saved to last_llm_response.txt ===")
     
-    alt_matches = list(re.finditer(alt_pattern, response, re.DOTALL))
-    print(f"Found {len(alt_matches)} alternative stacks with improved regex")
+    # Parse response into structured format
+    with metrics.stage("parse"):
+        parsed_response = parse_tech_stack_response(full_response)
     
-    for match in alt_matches:
-        stack_num = int(match.group(1))
-        alt_text = match.group(2)
-        
-        print(f"\n=== ALTERNATIVE STACK #{stack_num} ===")
-        print(f"Alt text length: {len(alt_text)}")
-        print(f"Alt text first 200 chars:\n{alt_text[:200]}\n")
-        
-        # Extract explanation lines
-        when_match = re.search(r'\*\*When to use this stack:\*\*\s*(.+?)(?:\n\n|\*\*)', alt_text, re.DOTALL)
-        trade_match = re.search(r'\*\*Primary trade-off vs recommended stack:\*\*\s*(.+?)(?:\n\n|\*\*)', alt_text, re.DOTALL)
-        why_match = re.search(r'\*\*Why this option is worth considering:\*\*\s*(.+?)(?:\n\n###)', alt_text, re.DOTALL)
-        
-        when_text = when_match.group(1).strip() if when_match else ""
-        trade_text = trade_match.group(1).strip() if trade_match else ""
-        why_text = why_match.group(1).strip() if why_match else ""
-        
-        print(f"When to use: {when_text[:100]}")
-        print(f"Trade off: {trade_text[:100]}")
-        print(f"Why consider: {why_text[:100]}\n")
-        
-        alternative_explanations.append({
-            "stack_num": stack_num,
-            "when_to_use": when_text,
-            "trade_off": trade_text,
-            "why_consider": why_text
-        })
-        
-        alt_stack = parse_stack_section(alt_text)
-        print(f"Parsed alternative #{stack_num}: Frontend={len(alt_stack.frontend)}, Backend={len(alt_stack.backend)}, DB={len(alt_stack.database)}")
-        alternatives.append(alt_stack)
+    # Fill canonical pros/cons/logo from the technology knowledge base
+    with metrics.stage("enrich"):
+        enriched_count = enrich_recommendation(parsed_response)
+    print(f"=== BACKEND LOG: Enriched {enriched_count} technologies from knowledge base ===")
     
-    return RecommendationResponse(
-        architecture_diagram=diagram,
-        primary=primary_stack,
-        alternatives=alternatives,
-        alternative_explanations=alternative_explanations
-    )
+    return parsed_response, custom_prompt, full_response
 
-def parse_stack_section(text: str) -> TechStack:
+async def warmup_generate(inputs: dict) -> tuple[dict, int, str]:
     """
-    Parse a single tech stack section (PRIMARY or ALTERNATIVE)
-    More robust parsing with better error handling
+    Generator used by the warm-up scheduler (not logged, so it does not skew request stats)
     """
-    stack = TechStack()
-    lines = text.split('\n')
-    current_category = None
-    current_tech = None
-    parsing_mode = None  # 'pros', 'cons', or 'why'
-    
-    print(f"\n=== PARSING STACK SECTION: {len(lines)} lines ===")
-    
-    for i, line in enumerate(lines):
-        line_stripped = line.strip()
-        if not line_stripped:
-            parsing_mode = None
-            continue
-        
-        # Skip explanation lines and examples
-        if any(kw in line_stripped for kw in ['When to use', 'Primary trade-off', 'Why this option', 'EXAMPLE']):
-            parsing_mode = None
-            continue
-        
-        # Detect category (###)
-        if line_stripped.startswith('### '):
-            # Save previous tech if exists
-            if current_tech and current_category:
-                cat_list = getattr(stack, current_category)
-                cat_list.append(current_tech)
-                print(f"  Added {current_tech.name} to {current_category}")
-            current_tech = None
-            parsing_mode = None
-            
-            # Identify new category
-            if 'Frontend' in line_stripped:
-                current_category = 'frontend'
-            elif 'Backend' in line_stripped:
-                current_category = 'backend'
-            elif 'Database' in line_stripped:
-                current_category = 'database'
-            elif 'DevOps' in line_stripped or 'Infrastructure' in line_stripped:
-                current_category = 'devops'
-            elif 'Additional' in line_stripped:
-                current_category = 'additional'
-            else:
-                current_category = None
-            
-            if current_category:
-                print(f"  Category: {current_category}")
-            continue
-        
-        # Extract tech name - look for **TechName** with dash and emoji/description
-        if line_stripped.startswith('**') and ' - ' in line_stripped and current_category:
-            # Save previous tech
-            if current_tech and current_category:
-                cat_list = getattr(stack, current_category)
-                cat_list.append(current_tech)
-            
-            # Match: **TechName** - emoji/description
-            match = re.search(r'\*\*([^*]+)\*\*\s*-\s*(.+)$', line_stripped)
-            if match:
-                tech_name = match.group(1).strip()
-                current_tech = TechItem(name=tech_name)
-                parsing_mode = None
-                print(f"    Found tech: {tech_name}")
-            continue
-        
-        # Section headers (case-insensitive)
-        if line_stripped.lower() == 'pros:' and current_tech:
-            parsing_mode = 'pros'
-            continue
-        
-        if line_stripped.lower() == 'cons:' and current_tech:
-            parsing_mode = 'cons'
-            continue
-        
-        if line_stripped.lower().startswith('why:') and current_tech:
-            # Extract inline why if exists
-            why_match = re.search(r'^why:\s*(.+)$', line_stripped, re.IGNORECASE)
-            if why_match and why_match.group(1):
-                current_tech.why = why_match.group(1).strip()
-                parsing_mode = None
-            else:
-                parsing_mode = 'why'
-            continue
-        
-        # Example blocks - skip them
-        if 'EXAMPLE' in line_stripped or 'example' in line_stripped:
-            parsing_mode = None
-            continue
-        
-        # Bullet point handling
-        if line_stripped.startswith('•') and current_tech:
-            bullet_text = line_stripped[1:].strip()
-            # Remove bold markers
-            bullet_text = re.sub(r'\*\*([^*]+)\*\*:\s*', '', bullet_text)
-            # Remove trailing punctuation except period in middle
-            bullet_text = re.sub(r'[,;]\s*$', '', bullet_text)
-            bullet_text = bullet_text.strip()
-            
-            if parsing_mode == 'pros' and bullet_text:
-                current_tech.pros.append(bullet_text)
-            elif parsing_mode == 'cons' and bullet_text:
-                current_tech.cons.append(bullet_text)
-            continue
-        
-        # Multi-line why continuation
-        if parsing_mode == 'why' and current_tech and line_stripped:
-            # Stop at next section
-            if line_stripped.startswith('###') or (line_stripped.startswith('**') and ' - ' in line_stripped):
-                parsing_mode = None
-                # Re-process this line as new category/tech
-                if line_stripped.startswith('### '):
-                    if 'Frontend' in line_stripped:
-                        current_category = 'frontend'
-                    elif 'Backend' in line_stripped:
-                        current_category = 'backend'
-                    elif 'Database' in line_stripped:
-                        current_category = 'database'
-                    elif 'DevOps' in line_stripped or 'Infrastructure' in line_stripped:
-                        current_category = 'devops'
-                    elif 'Additional' in line_stripped:
-                        current_category = 'additional'
-                    current_tech = None
-                continue
-            # Accumulate why
-            current_tech.why += ' ' + line_stripped
-            continue
-        
-        # Stop parsing sections when encountering new markers
-        if line_stripped.startswith('###') and parsing_mode:
-            parsing_mode = None
-    
-    # Don't forget the last tech
-    if current_tech and current_category:
-        cat_list = getattr(stack, current_category)
-        cat_list.append(current_tech)
-        print(f"  Added final {current_tech.name} to {current_category}")
-    
-    # Debug output
-    total_techs = len(stack.frontend) + len(stack.backend) + len(stack.database) + len(stack.devops) + len(stack.additional)
-    print(f"  PARSED TOTAL: {total_techs} technologies")
-    print(f"    Frontend: {len(stack.frontend)}, Backend: {len(stack.backend)}, Database: {len(stack.database)}, DevOps: {len(stack.devops)}, Additional: {len(stack.additional)}")
-    
-    return stack
-
+    full_inputs = StackRequest(**inputs).dict()
+    metrics = RequestMetrics(PROMPT_VERSION)
+    with tracer.start_trace("warmup.generate", **{"warmup.key": request_cache_key(full_inputs)}):
+        parsed_response, custom_prompt, full_response = await generate_recommendation(full_inputs, metrics)
+    tokens = metrics.total_tokens() or estimate_tokens(system_prompt + custom_prompt) + estimate_tokens(full_response)
+    return parsed_response.dict(exclude={"meta"}), tokens, custom_prompt
+
+warmup_scheduler = WarmupScheduler(
+    cache=recommendation_cache,
+    generate=warmup_generate,
+    log_file=LOG_DIR / "stack_recommendation_responses.jsonl",
+    prompt_version=PROMPT_VERSION,
+    top_n=WARMUP_TOP_N,
+    token_budget=WARMUP_TOKEN_BUDGET,
+    off_peak_window=WARMUP_OFF_PEAK_HOURS,
+    retriever=similarity_retriever,
+)
 
+@app.on_event("startup")
+async def start_background_tasks():
+    expired = recommendation_cache.prune_expired()
+    if expired:
+        print(f"=== BACKEND LOG: Removed {expired} expired cached recommendations ===")
+    indexed = similarity_retriever.build_from_cache(recommendation_cache)
+    print(f"=== BACKEND LOG: Similarity index built with {indexed} past recommendations ===")
+    if WARMUP_ENABLED:
+        print(f"=== BACKEND LOG: Cache warm-up enabled (top {WARMUP_TOP_N}, budget {WARMUP_TOKEN_BUDGET} tokens, off-peak {WARMUP_OFF_PEAK_HOURS}) ===")
+        warmup_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await warmup_scheduler.stop()
+    render_service.shutdown()
+    if trace_file_exporter:
+        trace_file_exporter.shutdown()
 
 # 9. API Endpoints
 
 # Endpoint 1: Generate Custom Prompt Based on User Inputs
 @app.post("/api/generate-prompt")
-async def generate_prompt(req: PromptGenerationRequest):
+async def generate_prompt(req: PromptGenerationRequest, response: Response, meta: bool = False):
     """
     Generate a custom prompt for tech stack recommendation based on user context
+    Pass ?meta=true to include timing/token usage in the response
     """
+    metrics = RequestMetrics(PROMPT_VERSION)
     try:
-        custom_prompt = await prompt_engineer_chain.ainvoke({
-            "appType": req.appType,
-            "scale": req.scale,
-            "focus": req.focus,
-            "teamSize": req.teamSize,
-            "budget": req.budget,
-            "timeToMarket": req.timeToMarket,
-            "securityLevel": req.securityLevel,
-            "customConstraints": req.customConstraints
-        })
+        with metrics.stage("prompt_engineer"):
+            custom_prompt = await prompt_engineer_chain.ainvoke({
+                "appType": req.appType,
+                "scale": req.scale,
+                "focus": req.focus,
+                "teamSize": req.teamSize,
+                "budget": req.budget,
+                "timeToMarket": req.timeToMarket,
+                "securityLevel": req.securityLevel,
+                "customConstraints": req.customConstraints
+            }, config=metrics.callbacks("prompt_engineer"))
         
         # Log the prompt generation - save both the generated prompt and system prompt
-        log_request_response(req.dict(), custom_prompt, "prompt_engineering", 
-                            custom_prompt=custom_prompt)
+        with metrics.stage("log"):
+            log_request_response(req.dict(), custom_prompt, "prompt_engineering", 
+                                custom_prompt=custom_prompt,
+                                latency_ms=metrics.total_ms())
         
-        return {"success": True, "prompt": custom_prompt}
+        result = {"success": True, "prompt": custom_prompt}
     except Exception as e:
-        return {"success": False, "error": str(e)}
+        result = {"success": False, "error": str(e)}
+    
+    response.headers["Server-Timing"] = metrics.server_timing_header()
+    if meta:
+        result["meta"] = metrics.to_meta()
+    return result
 
 # Endpoint 2: Recommend Tech Stack Using Generated Prompt
 @app.post("/api/recommend")
-async def recommend_stack(req: StackRequest):
+async def recommend_stack(req: StackRequest, response: Response, meta: bool = False):
     """
     Generate tech stack recommendation with context from user inputs
     Returns structured JSON response (non-streaming)
+    Pass ?meta=true to include timing/token usage in the response
     """
+    metrics = RequestMetrics(PROMPT_VERSION)
     try:
-        print("\n=== BACKEND LOG: Generating custom prompt ===")
-        custom_prompt = await prompt_engineer_chain.ainvoke({
-            "appType": req.appType,
-            "scale": req.scale,
-            "focus": req.focus,
-            "teamSize": req.teamSize,
-            "budget": req.budget,
-            "timeToMarket": req.timeToMarket,
-            "securityLevel": req.securityLevel,
-            "customConstraints": req.customConstraints
-        })
-        print(f"Custom prompt generated: {custom_prompt[:200]}...")
-        
-        print("=== BACKEND LOG: Generating tech stack recommendation ===")
-        # Get full response (not streaming)
-        full_response = await stack_chain.ainvoke({"custom_prompt": custom_prompt})
-        
-        print(f"\n=== BACKEND LOG: Full response length: {len(full_response)} ===")
-        print(f"=== BACKEND LOG: PRIMARY check: {'## PRIMARY' in full_response} ===")
-        print(f"=== BACKEND LOG: MERMAID check: {'```mermaid' in full_response} ===")
-        
-        # Debug: Save raw response to file for inspection
-        with open('last_llm_response.txt', 'w') as f:
-            f.write(full_response)
-        print(f"=== BACKEND LOG: Raw response saved to last_llm_response.txt ===")
-        
-        # Parse response into structured format
-        parsed_response = parse_tech_stack_response(full_response)
-        
-        # Log the response
-        log_request_response(req.dict(), full_response, "stack_recommendation",
-                            custom_prompt=custom_prompt, master_prompt=system_prompt)
-        
-        return parsed_response
+        # Serve popular (pre-generated) or repeated requests from the cache
+        with metrics.stage("cache_lookup"):
+            cache_key = request_cache_key(req.dict())
+            cached = recommendation_cache.get(cache_key, PROMPT_VERSION, include_refinements=False)
+        similar_entry, seed = None, ""
+        if not cached:
+            # Nearest past request: serve it if equivalent (only punctuation/case of the constraints differ),
+            # otherwise use it as a few-shot seed
+            with metrics.stage("similarity"):
+                # A few candidates, since a closer but non-equivalent neighbor can hide an equivalent one
+                for similar_key, score in similarity_retriever.nearest(req.dict(), k=5, exclude=cache_key):
+                    entry = recommendation_cache.get(similar_key, PROMPT_VERSION, include_refinements=False)
+                    if not entry:
+                        continue
+                    if is_equivalent_request(entry["inputs"], req.dict()):
+                        similar_entry = entry
+                        metrics.similarity = {"key": similar_key, "score": score, "mode": "serve"}
+                        break
+                    if not seed and score >= SIMILARITY_SEED_THRESHOLD:
+                        metrics.similarity = {"key": similar_key, "score": score, "mode": "seed"}
+                        seed = format_seed(entry["response"])
+        
+        if cached:
+            print(f"=== BACKEND LOG: Cache hit {cache_key} ({cached['source']}) ===")
+            metrics.cache_hit = True
+            # Still log cache hits so popularity stats stay accurate
+            with metrics.stage("log"):
+                log_request_response(req.dict(), "", "stack_recommendation", cache_hit=True,
+                                    latency_ms=metrics.total_ms())
+            result = RecommendationResponse(**cached["response"])
+            result.recommendation_id = cache_key
+        elif metrics.similarity and metrics.similarity["mode"] == "serve":
+            print(f"=== BACKEND LOG: Serving similar recommendation {metrics.similarity['key']} (score {metrics.similarity['score']:.3f}) ===")
+            result = RecommendationResponse(**similar_entry["response"])
+            # Stored under this request's own key, so /api/refine works from the caller's inputs
+            result.recommendation_id = cache_key
+            similarity_retriever.add(cache_key, req.dict())
+            with metrics.stage("log"):
+                recommendation_cache.set(cache_key, PROMPT_VERSION, req.dict(), result.dict(exclude={"meta"}),
+                                         source="similar", custom_prompt=similar_entry.get("custom_prompt", ""))
+                log_request_response(req.dict(), "", "stack_recommendation", cache_hit=True,
+                                    latency_ms=metrics.total_ms())
+        else:
+            result, custom_prompt, full_response = await generate_recommendation(req.dict(), metrics, seed=seed)
+            result.recommendation_id = cache_key
+            similarity_retriever.add(cache_key, req.dict())
+            
+            tokens = metrics.total_tokens() or estimate_tokens(system_prompt + custom_prompt) + estimate_tokens(full_response)
+            with metrics.stage("log"):
+                recommendation_cache.set(cache_key, PROMPT_VERSION, req.dict(), result.dict(exclude={"meta"}), tokens=tokens,
+                                         custom_prompt=custom_prompt,
+                                         tokens_estimated=metrics.tokens_estimated() or not metrics.total_tokens())
+                
+                # Log the response
+                log_request_response(req.dict(), full_response, "stack_recommendation",
+                                    custom_prompt=custom_prompt, master_prompt=system_prompt,
+                                    latency_ms=metrics.total_ms(),
+                                    parse_stats=recommendation_parse_stats(result),
+                                    stream_guard=metrics.stream_guard)
+        
+        if meta:
+            result.meta = metrics.to_meta()
         
     except Exception as e:
         print(f"Error in recommend_stack: {e}")
+        result = {"error": str(e)}
+        if meta:
+            result["meta"] = metrics.to_meta()
+    
+    response.headers["Server-Timing"] = metrics.server_timing_header()
+    return result
+
+# Endpoint 3: Refine a Stored Recommendation After a Field Change
+@app.post("/api/refine")
+async def refine_stack(req: RefineRequest, response: Response, meta: bool = False):
+    """
+    Apply a field diff to a stored recommendation and regenerate only the affected parts
+    (e.g. only the COST alternative when the budget changes). Returns a new RecommendationResponse.
+    Pass ?meta=true to include timing/token usage in the response
+    """
+    metrics = RequestMetrics(PROMPT_VERSION)
+    full_response = ""
+    try:
+        with metrics.stage("cache_lookup"):
+            previous = recommendation_cache.load(req.recommendation_id)
+        if not previous:
+            raise ValueError(f"Unknown recommendation_id: {req.recommendation_id}")
+        
+        unknown_fields = set(req.changes) - set(StackRequest.model_fields)
+        if unknown_fields:
+            raise ValueError(f"Unknown fields in changes: {', '.join(sorted(unknown_fields))}")
+        
+        new_inputs = StackRequest(**{**previous["inputs"], **req.changes}).dict()
+        new_key = request_cache_key(new_inputs)
+        refine_key = refinement_cache_key(req.recommendation_id, new_inputs)
+        fields = changed_fields(previous["inputs"], new_inputs)
+        stack_nums = plan_refinement(fields)
+        print(f"=== BACKEND LOG: Refine {req.recommendation_id} -> {new_key}, changed {sorted(fields)}, regenerate {stack_nums if stack_nums is not None else 'ALL'} ===")
+        
+        # A full generation for the new inputs beats an earlier partial refinement of this recommendation
+        cached = (recommendation_cache.get(new_key, PROMPT_VERSION, include_refinements=False)
+                  or recommendation_cache.get(refine_key, PROMPT_VERSION))
+        store_key, source = new_key, "request"
+        if cached:
+            metrics.cache_hit = True
+            result = RecommendationResponse(**cached["response"])
+            custom_prompt = cached.get("custom_prompt", "")
+            store_key = cached["key"]
+        elif previous.get("prompt_version") != PROMPT_VERSION or stack_nums is None:
+            # Primary-driving field changed (or the stored answer is from an old prompt) - regenerate everything
+            result, custom_prompt, full_response = await generate_recommendation(new_inputs, metrics)
+        elif not stack_nums:
+            # Nothing that affects the output changed (e.g. only formatting of a value)
+            result = RecommendationResponse(**previous["response"])
+            custom_prompt = previous.get("custom_prompt", "")
+            store_key = req.recommendation_id
+        else:
+            custom_prompt = previous.get("custom_prompt") or describe_inputs(previous["inputs"])
+            previous_response = RecommendationResponse(**previous["response"])
+            primary_names = [
+                item.name
+                for category in ("frontend", "backend", "database", "devops", "additional")
+                for item in getattr(previous_response.primary, category)
+            ]
+            refine_prompt = build_refine_prompt(custom_prompt, new_inputs, fields, stack_nums, primary_names)
+            
+            print("=== BACKEND LOG: Regenerating affected alternative stacks ===")
+            with metrics.stage("stack_llm"):
+                guard = StreamGuard(expected_alternatives=stack_nums, expect_primary=False, max_tokens=STACK_MAX_TOKENS)
+                full_response = await stream_stack_response(refine_prompt, metrics, guard, chain=refine_chain)
+            
+            with metrics.stage("parse"):
+                new_alternatives = [
+                    parse_alternative_section(stack_num, alt_text)
+                    for stack_num, alt_text in split_alternative_sections(full_response)
+                    if stack_num in stack_nums
+                ]
+            if not new_alternatives:
+                raise ValueError("Refinement response did not contain the requested alternative stacks")
+            
+            merged = merge_alternatives(
+                previous_response.dict(exclude={"meta"}),
+                [(stack.dict(), explanation) for stack, explanation in new_alternatives],
+            )
+            result = RecommendationResponse(**merged)
+            with metrics.stage("enrich"):
+                enrich_recommendation(result)
+            # The PRIMARY stack and diagram were written for the old inputs, so keep this out of the
+            # canonical key (and the similarity index) that /api/recommend and warm-up serve from
+            store_key, source = refine_key, "refine"
+        
+        result.recommendation_id = store_key
+        if not metrics.cache_hit and full_response:
+            with metrics.stage("log"):
+                recommendation_cache.set(store_key, PROMPT_VERSION, new_inputs, result.dict(exclude={"meta"}),
+                                         tokens=metrics.total_tokens(), source=source, custom_prompt=custom_prompt,
+                                         tokens_estimated=metrics.tokens_estimated())
+                if source != "refine":
+                    similarity_retriever.add(store_key, new_inputs)
+                # Logged separately so refinements do not skew the popular-request stats used by warm-up
+                log_request_response(new_inputs, full_response, "stack_refinement",
+                                    custom_prompt=custom_prompt, latency_ms=metrics.total_ms(),
+                                    parse_stats=recommendation_parse_stats(result),
+                                    stream_guard=metrics.stream_guard)
+        
+        if meta:
+            result.meta = metrics.to_meta()
+        
+    except Exception as e:
+        print(f"Error in refine_stack: {e}")
+        result = {"error": str(e)}
+        if meta:
+            result["meta"] = metrics.to_meta()
+    
+    response.headers["Server-Timing"] = metrics.server_timing_header()
+    return result
+
+# Endpoint 4: Render Diagram (SVG) or Report (PDF) Server-Side
+@app.post("/api/render/{fmt}")
+async def render_recommendation(fmt: str, req: RecommendationResponse):
+    """
+    Render a recommendation to SVG (architecture diagram) or PDF (full report).
+    Artifacts are cached by content hash, so repeated exports are served from disk.
+    """
+    try:
+        with tracer.span("render", format=fmt) as span:
+            content, media_type, content_hash, cache_hit = await render_service.render(fmt, req.dict(exclude={"meta"}))
+            span.set_attribute("render.cache_hit", cache_hit)
+    except Exception as e:
+        print(f"Error in render_recommendation: {e}")
         return {"error": str(e)}
+    print(f"=== BACKEND LOG: Rendered {fmt} {content_hash[:12]} (cache {'hit' if cache_hit else 'miss'}) ===")
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"ETag": f'"{content_hash}"', "X-Render-Cache": "hit" if cache_hit else "miss"},
+    )
 
-# Endpoint 3: Debug - Show what system prompt looks like
+# Endpoint 5: Debug - Show what system prompt looks like
 @app.get("/api/debug/system-prompt")
 def debug_system_prompt():
     """
@@ -889,11 +924,29 @@ def debug_system_prompt():
         "sample_section": system_prompt[100:400]
     }
 
-# Endpoint 4: Health Check
+# Endpoint 6: Debug - Span breakdown of recent requests
+@app.get("/api/debug/traces")
+def debug_traces():
+    """
+    IDs of the most recent traces kept in memory (newest last)
+    """
+    return {"trace_ids": trace_store.trace_ids()}
+
+@app.get("/api/debug/traces/{trace_id}")
+def debug_trace(trace_id: str):
+    """
+    Spans of one recent trace (OTLP/JSON) plus a readable breakdown
+    """
+    spans = trace_store.get_trace(trace_id)
+    if not spans:
+        return {"error": f"Trace {trace_id} not found (only the most recent traces are kept in memory)"}
+    return {"trace_id": trace_id, "breakdown": format_trace(spans).split("\n"), "spans": spans}
+
+# Endpoint 7: Health Check
 @app.get("/")
 def home():
     return {
         "message": "TechStack.Studio Brain is Active 🧠",
         "version": "2.0",
-        "features": ["prompt_engineering", "tech_stack_recommendation", "mermaid_diagrams", "logging"]
+        "features": ["prompt_engineering", "tech_stack_recommendation", "mermaid_diagrams", "logging", "refinement", "server_rendering", "tracing"]
     }
\ No newline at end of file
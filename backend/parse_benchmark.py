@@ -0,0 +1,222 @@
+"""
+Parse Quality & Robustness Runner
+
+1. Regression: parses every response in parse_corpus/ and compares a structural
+   summary (diagram validity, techs per category, alternatives) with
+   parse_corpus/expected.json.
+2. Fuzz/benchmark: feeds truncated, mutated and adversarial inputs of increasing
+   size to the parser hot path and reports the worst-case time per input size.
+   Fails if any single call exceeds the time budget, so catastrophic regex
+   backtracking cannot reach production.
+
+Usage:
+    python parse_benchmark.py                  # regression + fuzz, exit 1 on failure
+    python parse_benchmark.py --update         # rewrite expected.json from the current parser
+    python parse_benchmark.py --sizes 1000 10000 100000 --budget-ms 500 --seed 7
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from response_parser import (
+    parse_stack_section,
+    parse_tech_stack_response,
+    sanitize_mermaid_code,
+    validate_mermaid_syntax,
+)
+
+CORPUS_DIR = Path(__file__).parent / "parse_corpus"
+EXPECTED_FILE = CORPUS_DIR / "expected.json"
+
+CATEGORIES = ["frontend", "backend", "database", "devops", "additional"]
+
+# Parser entry points exercised by the fuzzer
+TARGETS = {
+    "parse_tech_stack_response": parse_tech_stack_response,
+    "parse_stack_section": parse_stack_section,
+    "sanitize_mermaid_code": sanitize_mermaid_code,
+    "validate_mermaid_syntax": validate_mermaid_syntax,
+}
+
+# 1. Corpus Regression
+def load_corpus() -> dict[str, str]:
+    return {path.name: path.read_text() for path in sorted(CORPUS_DIR.glob("*.md"))}
+
+def quiet_call(fn, *args):
+    """
+    Call a parser function with its debug prints suppressed
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+def summarize_parse(response: str) -> dict:
+    """
+    Structural summary of a parsed response, stable enough to diff across changes
+    """
+    parsed = quiet_call(parse_tech_stack_response, response)
+    diagram_valid, _ = validate_mermaid_syntax(parsed.architecture_diagram)
+
+    def stack_summary(stack) -> dict:
+        return {category: [item.name for item in getattr(stack, category)] for category in CATEGORIES}
+
+    return {
+        "diagram_valid": diagram_valid,
+        "primary": stack_summary(parsed.primary),
+        "primary_with_why": sum(1 for c in CATEGORIES for item in getattr(parsed.primary, c) if item.why),
+        "alternatives": [stack_summary(alt) for alt in parsed.alternatives],
+        "alternative_explanations": [
+            {key: bool(expl[key]) for key in ("when_to_use", "trade_off", "why_consider")} | {"stack_num": expl["stack_num"]}
+            for expl in parsed.alternative_explanations
+        ],
+    }
+
+def run_regression(update: bool = False) -> list[str]:
+    """
+    Compare corpus summaries with expected.json, returns a list of failure messages
+    """
+    actual = {name: summarize_parse(text) for name, text in load_corpus().items()}
+    if update:
+        EXPECTED_FILE.write_text(json.dumps(actual, indent=2, ensure_ascii=False) + "\n")
+        print(f"Updated {EXPECTED_FILE.name} with {len(actual)} corpus entries")
+        return []
+
+    expected = json.loads(EXPECTED_FILE.read_text()) if EXPECTED_FILE.exists() else {}
+    failures = []
+    for name, summary in actual.items():
+        if name not in expected:
+            failures.append(f"{name}: no expected summary (run with --update)")
+        elif expected[name] != summary:
+            failures.append(f"{name}: parse result changed\n  expected: {json.dumps(expected[name], ensure_ascii=False)}\n  actual:   {json.dumps(summary, ensure_ascii=False)}")
+    for name in expected.keys() - actual.keys():
+        failures.append(f"{name}: listed in expected.json but missing from corpus")
+    return failures
+
+# 2. Fuzz Input Generators
+def fit(text: str, size: int) -> str:
+    """
+    Repeat or cut text to exactly `size` characters
+    """
+    if not text:
+        return ""
+    return (text * (size // len(text) + 1))[:size]
+
+def generate_inputs(corpus: dict[str, str], size: int, rng: random.Random) -> list[tuple[str, str]]:
+    """
+    Return (kind, text) fuzz inputs of roughly `size` characters
+    """
+    samples = list(corpus.values())
+    base = fit("".join(samples), size)
+    inputs = [
+        ("corpus_repeated", base),
+        ("truncated", base[: rng.randint(size // 2, size)]),
+        # Unterminated constructs that make lazy/greedy regexes scan to the end
+        ("open_brackets", fit("A[", size)),
+        ("open_brackets_arrow", "A -->|x| " + fit("B[", size)),
+        ("whitespace_run", " " * size + "x"),
+        ("whitespace_run_bracket", fit(" \t", size) + "["),
+        ("inner_whitespace_run", "graph TD\nA[a] --> B[b]\nA" + " " * size + "B"),
+        ("open_pipes", fit("-->|", size)),
+        ("pipe_run", "A -->|" + "|" * size),
+        ("bold_run", fit("**", size)),
+        ("bold_dash_run", "**" + fit("a - ", size)),
+        ("unclosed_mermaid_fence", "```mermaid\n" + fit("A --> B\n", size)),
+        ("header_flood", fit("## ALTERNATIVE STACK #1\n", size)),
+        ("alt_header_no_newline", fit("## ALTERNATIVE STACK #1 ", size)),
+        ("explanation_unterminated", "## ALTERNATIVE STACK #1\n**When to use this stack:** " + fit("a*", size)),
+        ("why_unterminated", "## ALTERNATIVE STACK #1\n**Why this option is worth considering:** " + fit("x\n", size)),
+        ("why_repeated", "## ALTERNATIVE STACK #1\n" + fit("**Why this option is worth considering:** x\n", size)),
+        ("when_repeated", "## ALTERNATIVE STACK #1\n" + fit("**When to use this stack:** x", size)),
+        ("primary_unterminated", "## PRIMARY Technology Stack\n" + fit("## ALTERNATIV", size)),
+        ("bullet_flood", "### Frontend\n**React** - x\nPros:\n" + fit("• **a**: b,;\n", size)),
+        ("single_long_line", fit("".join(samples).replace("\n", " "), size)),
+    ]
+
+    # Random mutations of real responses (insert/delete/duplicate spans)
+    mutated = list(base)
+    for _ in range(max(1, size // 200)):
+        if not mutated:
+            break
+        pos = rng.randrange(len(mutated))
+        op = rng.random()
+        if op < 0.4:
+            mutated.insert(pos, rng.choice(["[", "]", "|", "*", "#", "\n", " ", "-->", "```"]))
+        elif op < 0.8:
+            del mutated[pos:pos + rng.randint(1, 20)]
+        else:
+            span = mutated[pos:pos + rng.randint(1, 50)]
+            mutated[pos:pos] = span
+    inputs.append(("mutated", "".join(mutated)[:size]))
+    return inputs
+
+# 3. Timing
+def time_call(fn, text: str) -> tuple[float, str | None]:
+    """
+    Time a single parser call in milliseconds, returns (elapsed_ms, error)
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        quiet_call(fn, text)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return (time.perf_counter() - start) * 1000, error
+
+def run_fuzz(sizes: list[int], budget_ms: float, seed: int) -> tuple[list[str], list[dict]]:
+    """
+    Run every fuzz input against every target, returns (failures, worst-case rows)
+    """
+    rng = random.Random(seed)
+    corpus = load_corpus()
+    failures = []
+    rows = []
+    for size in sizes:
+        inputs = generate_inputs(corpus, size, rng)
+        for target_name, fn in TARGETS.items():
+            worst_ms, worst_kind = 0.0, ""
+            for kind, text in inputs:
+                elapsed_ms, error = time_call(fn, text)
+                if error:
+                    failures.append(f"{target_name} raised on {kind} (size {size}): {error}")
+                if elapsed_ms > budget_ms:
+                    failures.append(f"{target_name} took {elapsed_ms:.0f}ms on {kind} (size {size}), budget {budget_ms:.0f}ms")
+                if elapsed_ms > worst_ms:
+                    worst_ms, worst_kind = elapsed_ms, kind
+            rows.append({"target": target_name, "size": size, "worst_ms": round(worst_ms, 2), "worst_input": worst_kind})
+    return failures, rows
+
+def format_rows(rows: list[dict]) -> str:
+    lines = [f"{'target':<28}{'size':>9}{'worst_ms':>12}  worst_input"]
+    for row in rows:
+        lines.append(f"{row['target']:<28}{row['size']:>9}{row['worst_ms']:>12.2f}  {row['worst_input']}")
+    return "\n".join(lines)
+
+# 4. CLI
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Parser regression corpus and fuzz/benchmark runner")
+    parser.add_argument("--update", action="store_true", help="Rewrite expected.json from the current parser")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Fuzz input sizes in characters")
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="Max time for a single parser call")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for truncation/mutation inputs")
+    parser.add_argument("--skip-fuzz", action="store_true", help="Only run the corpus regression")
+    args = parser.parse_args(argv)
+
+    failures = run_regression(update=args.update)
+    print(f"=== Corpus regression: {len(load_corpus())} responses, {len(failures)} failures ===")
+
+    if not args.skip_fuzz:
+        fuzz_failures, rows = run_fuzz(args.sizes, args.budget_ms, args.seed)
+        print(f"=== Fuzz/benchmark (budget {args.budget_ms:.0f}ms per call) ===")
+        print(format_rows(rows))
+        failures += fuzz_failures
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Recommendation Cache
+
+Stores parsed recommendations on disk keyed by the normalized request inputs.
+Every entry records the prompt version it was generated with; entries from an
+older prompt version are treated as misses so they get regenerated. Entries older
+than the TTL are misses too, and are deleted from disk by `prune_expired`.
+
+Partial refinements (/api/refine regenerating only some alternatives) are stored
+under their own key, derived from the refined recommendation, so they are never
+served to /api/recommend as a full generation for the new inputs.
+"""
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Fields that make up a StackRequest, in a fixed order for hashing
+REQUEST_FIELDS = ["appType", "scale", "focus", "teamSize", "budget", "timeToMarket", "securityLevel", "customConstraints"]
+
+# Values the frontend/backend use for "nothing selected"
+EMPTY_VALUES = {"", "not specified", "standard", "none"}
+
+def normalize_inputs(inputs: dict) -> dict:
+    """
+    Normalize request inputs so equivalent requests share a cache key
+    (case, whitespace, ordering of multi-select values, empty defaults)
+    """
+    normalized = {}
+    for field in REQUEST_FIELDS:
+        value = str(inputs.get(field) or "").strip().lower()
+        if field != "customConstraints":
+            # Multi-select values are joined with ", " by the frontend
+            parts = sorted(p.strip() for p in value.split(",") if p.strip())
+            value = ", ".join(parts)
+        value = " ".join(value.split())
+        normalized[field] = "" if value in EMPTY_VALUES else value
+    return normalized
+
+def request_cache_key(inputs: dict) -> str:
+    """
+    Stable cache key for a set of request inputs
+    """
+    payload = json.dumps(normalize_inputs(inputs), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def refinement_cache_key(base_key: str, inputs: dict) -> str:
+    """
+    Cache key for a partial refinement of the recommendation stored under base_key
+    """
+    payload = json.dumps({"refines": base_key, "inputs": normalize_inputs(inputs)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def is_valid_cache_key(key: str) -> bool:
+    """
+    Keys come from clients (recommendation_id), so only accept the hex format we generate
+    """
+    return bool(re.fullmatch(r'[0-9a-f]{24}', key or ""))
+
+class RecommendationCache:
+    """
+    JSON-file cache of parsed recommendations with a bounded (LRU) in-memory front.
+    ttl_days=0 keeps entries forever.
+    """
+
+    def __init__(self, cache_dir: Path, max_memory_entries: int = 256, ttl_days: float = 30):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self.ttl = timedelta(days=ttl_days) if ttl_days else None
+        self._memory: OrderedDict[str, dict] = OrderedDict()
+
+    def _remember(self, key: str, entry: dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, key: str) -> dict | None:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Cache read error for {key}: {e}")
+            return None
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def is_expired(self, entry: dict) -> bool:
+        if not self.ttl:
+            return False
+        try:
+            return datetime.now() - datetime.fromisoformat(entry.get("created_at") or "") > self.ttl
+        except ValueError:
+            return True
+
+    def load(self, key: str) -> dict | None:
+        """
+        Return the raw cache entry for a key regardless of prompt version
+        """
+        if not is_valid_cache_key(key):
+            return None
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        entry = self._read(key)
+        if entry:
+            self._remember(key, entry)
+        return entry
+
+    def get(self, key: str, prompt_version: str, include_refinements: bool = True) -> dict | None:
+        """
+        Return the cached entry if it was generated with the current prompt version.
+        With include_refinements=False, partial refinements are treated as misses.
+        """
+        entry = self.load(key)
+        if not entry or entry.get("prompt_version") != prompt_version or self.is_expired(entry):
+            return None
+        if not include_refinements and entry.get("source") == "refine":
+            return None
+        return entry
+
+    def set(self, key: str, prompt_version: str, inputs: dict, response: dict, tokens: int = 0, source: str = "request",
+            custom_prompt: str = "", tokens_estimated: bool = False) -> dict:
+        """
+        Store a parsed recommendation (as a plain dict) under a key
+        """
+        entry = {
+            "key": key,
+            "prompt_version": prompt_version,
+            "created_at": datetime.now().isoformat(),
+            "source": source,
+            "tokens": tokens,
+            "tokens_estimated": tokens_estimated,  # True when (part of) the count is a ~4 chars/token estimate
+            "inputs": inputs,
+            "custom_prompt": custom_prompt,  # Generated project context, reused by /api/refine
+            "response": response,
+        }
+        self._remember(key, entry)
+        try:
+            with open(self._path(key), "w") as f:
+                json.dump(entry, f)
+        except Exception as e:
+            print(f"Cache write error for {key}: {e}")
+        return entry
+
+    def iter_entries(self):
+        """
+        Yield every unexpired stored entry (used to rebuild the similarity index at startup).
+        Entries are read straight from disk and not kept in memory.
+        """
+        for path in sorted(self.cache_dir.glob("*.json")):
+            if not is_valid_cache_key(path.stem):
+                continue
+            entry = self._memory.get(path.stem) or self._read(path.stem)
+            if entry and not self.is_expired(entry):
+                yield entry
+
+    def prune_expired(self) -> int:
+        """
+        Delete entries past the TTL from disk and memory (file mtime is the write time,
+        so no entry has to be read). Returns the number of entries removed.
+        """
+        if not self.ttl:
+            return 0
+        cutoff = time.time() - self.ttl.total_seconds()
+        removed = 0
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    self._memory.pop(path.stem, None)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def is_fresh(self, key: str, prompt_version: str) -> bool:
+        return self.get(key, prompt_version, include_refinements=False) is not None
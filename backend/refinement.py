@@ -0,0 +1,89 @@
+"""
+Incremental Refinement
+
+When a user changes a single field and resubmits, only the parts of a stored
+recommendation that depend on that field are regenerated:
+
+- budget                 -> ALTERNATIVE STACK #1 (COST)
+- teamSize, timeToMarket -> ALTERNATIVE STACK #2 (DEVELOPER EXPERIENCE)
+- appType, scale, focus, securityLevel, customConstraints -> full regeneration
+  (scale drives the PRIMARY stack too, not just the SCALABILITY alternative)
+
+Everything else is reused from the stored recommendation.
+"""
+from recommendation_cache import REQUEST_FIELDS, normalize_inputs
+
+# Which alternative stack each field drives (numbers match the system prompt's ordering)
+FIELD_ALTERNATIVES = {
+    "budget": {1},
+    "teamSize": {2},
+    "timeToMarket": {2},
+}
+
+# Fields that change the PRIMARY stack (and therefore everything)
+FULL_REGENERATION_FIELDS = {"appType", "scale", "focus", "securityLevel", "customConstraints"}
+
+ALTERNATIVE_FOCUS = {
+    1: "Optimize for COST (cheapest free/open-source options)",
+    2: "Optimize for DEVELOPER EXPERIENCE (fastest development, easiest to learn)",
+    3: "Optimize for SCALABILITY (handle 10x or 100x growth, performance-focused)",
+}
+
+def changed_fields(old_inputs: dict, new_inputs: dict) -> set[str]:
+    """
+    Fields whose normalized values differ between two sets of inputs
+    """
+    old, new = normalize_inputs(old_inputs), normalize_inputs(new_inputs)
+    return {field for field in REQUEST_FIELDS if old[field] != new[field]}
+
+def plan_refinement(fields: set[str]) -> set[int] | None:
+    """
+    Return the alternative stack numbers to regenerate, or None for a full regeneration
+    """
+    if fields & FULL_REGENERATION_FIELDS:
+        return None
+    stack_nums = set()
+    for field in fields:
+        stack_nums |= FIELD_ALTERNATIVES.get(field, set())
+    return stack_nums
+
+def describe_inputs(inputs: dict) -> str:
+    return (
+        f"App Type: {inputs['appType']}, Scale: {inputs['scale']}, Focus: {inputs['focus']}, "
+        f"Team Size: {inputs['teamSize']}, Budget: {inputs['budget']}, Time to Market: {inputs['timeToMarket']}, "
+        f"Security Level: {inputs['securityLevel']}, Additional: {inputs['customConstraints']}"
+    )
+
+def build_refine_prompt(previous_context: str, new_inputs: dict, fields: set[str], stack_nums: set[int], primary_names: list[str]) -> str:
+    """
+    User prompt asking the stack model to regenerate ONLY the given alternative stacks
+    """
+    sections = "\n".join(f"## ALTERNATIVE STACK #{num} - {ALTERNATIVE_FOCUS.get(num, '')}" for num in sorted(stack_nums))
+    changes = ", ".join(f"{field} is now \"{new_inputs[field]}\"" for field in sorted(fields))
+    return f"""{previous_context}
+
+UPDATED PROJECT DETAILS: {describe_inputs(new_inputs)}
+What changed: {changes}
+
+The PRIMARY stack ({", ".join(primary_names) or "unchanged"}) and the other alternatives are already decided and must NOT be repeated.
+Output ONLY the following section(s), each with its "When to use this stack", "Primary trade-off vs recommended stack", "Why this option is worth considering" lines, its Mermaid diagram and its full tech stack, exactly in the ALTERNATIVE format:
+{sections}
+
+Do NOT output the top-level Architecture Diagram, the PRIMARY Technology Stack or any other alternative."""
+
+def merge_alternatives(previous: dict, new_alternatives: list[tuple[dict, dict]]) -> dict:
+    """
+    Replace (or add) alternative stacks in a stored response dict.
+    new_alternatives is a list of (tech_stack_dict, explanation_dict) keyed by explanation["stack_num"].
+    """
+    merged = dict(previous)
+    slots = {
+        expl["stack_num"]: (stack, expl)
+        for stack, expl in zip(previous.get("alternatives", []), previous.get("alternative_explanations", []))
+    }
+    for stack, expl in new_alternatives:
+        slots[expl["stack_num"]] = (stack, expl)
+    ordered = [slots[num] for num in sorted(slots)]
+    merged["alternatives"] = [stack for stack, _ in ordered]
+    merged["alternative_explanations"] = [expl for _, expl in ordered]
+    return merged
@@ -0,0 +1,469 @@
+"""
+Render Service
+
+Server-side rendering of recommendations so clients don't have to re-render the
+Mermaid diagram and re-layout the PDF on every export:
+
+- SVG: the validated architecture diagram (the `graph TD` subset allowed by the
+  system prompt: <= ~10 nodes, simple `-->` arrows) laid out in layers
+- PDF: the diagram plus the primary and alternative stacks
+
+Both renderers are pure Python (no browser, no extra dependencies) and run in a
+process pool off the event loop. Output is stored in a content-addressed cache
+keyed by the hash of the recommendation content, capped in total size (least
+recently used artifacts are removed first).
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from response_parser import validate_mermaid_syntax
+
+# Bump when rendering output changes so cached artifacts are regenerated
+RENDERER_VERSION = "1"
+
+CATEGORY_TITLES = [
+    ("frontend", "Frontend"),
+    ("backend", "Backend"),
+    ("database", "Database"),
+    ("devops", "DevOps/Infrastructure"),
+    ("additional", "Additional Services"),
+]
+
+# 1. Mermaid Graph Parsing
+NODE_PATTERN = re.compile(r'([A-Za-z0-9_]+)\s*(\(\[.*?\]\)|\[\(.*?\)\]|\(\(.*?\)\)|\[.*?\])?')
+
+SHAPES = [("([", "])", "stadium"), ("[(", ")]", "cylinder"), ("((", "))", "circle"), ("[", "]", "rect")]
+
+def _parse_node(text: str, nodes: dict) -> str | None:
+    """
+    Parse a node reference/definition, register it in `nodes` and return its ID
+    """
+    match = NODE_PATTERN.match(text.strip())
+    if not match:
+        return None
+    node_id, shape_text = match.group(1), match.group(2)
+    label, shape = node_id, "rect"
+    if shape_text:
+        for start, end, shape_name in SHAPES:
+            if shape_text.startswith(start) and shape_text.endswith(end):
+                label, shape = shape_text[len(start):-len(end)], shape_name
+                break
+    if node_id not in nodes or shape_text:
+        nodes[node_id] = {"label": label.replace("_", " ").strip() or node_id, "shape": shape}
+    return node_id
+
+def parse_mermaid_graph(code: str) -> tuple[dict, list]:
+    """
+    Parse `graph TD` code into nodes {id: {label, shape}} and edges [(src, dst, label)]
+    """
+    nodes, edges = {}, []
+    for line in code.split("\n"):
+        line = line.strip()
+        if not line or line.startswith("graph") or line.startswith("%%"):
+            continue
+        parts = line.split("-->")
+        src = _parse_node(parts[0], nodes)
+        for part in parts[1:]:
+            label = ""
+            part = part.strip()
+            label_match = re.match(r'\|([^|]*)\|\s*(.*)$', part)
+            if label_match:
+                label, part = label_match.group(1).replace("_", " ").strip(), label_match.group(2)
+            dst = _parse_node(part, nodes)
+            if src and dst:
+                edges.append((src, dst, label))
+            src = dst
+    return nodes, edges
+
+# 2. Layered Layout
+NODE_HEIGHT = 40
+LAYER_GAP = 70
+NODE_GAP = 30
+CHAR_WIDTH = 7
+
+def layout_graph(nodes: dict, edges: list) -> tuple[dict, float, float]:
+    """
+    Assign each node a box (x, y, w, h) in top-down layers (longest path from a root).
+    Returns (boxes, width, height)
+    """
+    layer = {node_id: 0 for node_id in nodes}
+    # Longest-path layering; bounded by the node count so cycles cannot loop forever
+    for _ in range(len(nodes)):
+        changed = False
+        for src, dst, _ in edges:
+            if src != dst and layer[dst] < layer[src] + 1 and layer[src] + 1 < len(nodes):
+                layer[dst] = layer[src] + 1
+                changed = True
+        if not changed:
+            break
+
+    layers = {}
+    for node_id in nodes:  # insertion order keeps the LLM's ordering within a layer
+        layers.setdefault(layer[node_id], []).append(node_id)
+
+    sizes = {node_id: max(90, len(node["label"]) * CHAR_WIDTH + 24) for node_id, node in nodes.items()}
+    row_widths = {index: sum(sizes[n] for n in row) + NODE_GAP * (len(row) - 1) for index, row in layers.items()}
+    width = max(row_widths.values(), default=0) + 2 * NODE_GAP
+    height = len(layers) * NODE_HEIGHT + max(len(layers) - 1, 0) * LAYER_GAP + 2 * NODE_GAP
+
+    boxes = {}
+    for index, row in sorted(layers.items()):
+        x = (width - row_widths[index]) / 2
+        y = NODE_GAP + index * (NODE_HEIGHT + LAYER_GAP)
+        for node_id in row:
+            boxes[node_id] = (x, y, sizes[node_id], NODE_HEIGHT)
+            x += sizes[node_id] + NODE_GAP
+    return boxes, width, height
+
+def _edge_points(src_box: tuple, dst_box: tuple) -> tuple[float, float, float, float]:
+    sx, sy, sw, sh = src_box
+    dx, dy, dw, dh = dst_box
+    if dy > sy:
+        return sx + sw / 2, sy + sh, dx + dw / 2, dy
+    if dy < sy:
+        return sx + sw / 2, sy, dx + dw / 2, dy + dh
+    # Same layer: connect the facing sides
+    if dx > sx:
+        return sx + sw, sy + sh / 2, dx, dy + dh / 2
+    return sx, sy + sh / 2, dx + dw, dy + dh / 2
+
+def _arrow_head(x1: float, y1: float, x2: float, y2: float, size: float = 8) -> list[tuple[float, float]]:
+    length = max(((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5, 1e-6)
+    ux, uy = (x2 - x1) / length, (y2 - y1) / length
+    bx, by = x2 - ux * size, y2 - uy * size
+    return [(x2, y2), (bx - uy * size / 2, by + ux * size / 2), (bx + uy * size / 2, by - ux * size / 2)]
+
+# 3. SVG Renderer
+def _xml_escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+def render_diagram_svg(diagram: str) -> str:
+    """
+    Render a Mermaid `graph TD` diagram to SVG. Invalid diagrams render as an error box.
+    """
+    is_valid, result = validate_mermaid_syntax(diagram)
+    if not is_valid:
+        message = _xml_escape(f"Architecture diagram could not be generated: {result}")
+        return (
+            '<svg xmlns="http://www.w3.org/2000/svg" width="480" height="60" viewBox="0 0 480 60">'
+            '<rect x="1" y="1" width="478" height="58" fill="#fff7ed" stroke="#f97316"/>'
+            f'<text x="240" y="35" text-anchor="middle" font-family="sans-serif" font-size="12" fill="#9a3412">{message}</text>'
+            "</svg>"
+        )
+
+    nodes, edges = parse_mermaid_graph(result)
+    boxes, width, height = layout_graph(nodes, edges)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" viewBox="0 0 {width:.0f} {height:.0f}" font-family="sans-serif" font-size="12">',
+        f'<rect width="{width:.0f}" height="{height:.0f}" fill="#ffffff"/>',
+    ]
+    for src, dst, label in edges:
+        x1, y1, x2, y2 = _edge_points(boxes[src], boxes[dst])
+        head = " ".join(f"{x:.1f},{y:.1f}" for x, y in _arrow_head(x1, y1, x2, y2))
+        parts.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" stroke="#64748b" stroke-width="1.5"/>')
+        parts.append(f'<polygon points="{head}" fill="#64748b"/>')
+        if label:
+            parts.append(
+                f'<text x="{(x1 + x2) / 2 + 4:.1f}" y="{(y1 + y2) / 2:.1f}" font-size="10" fill="#475569">{_xml_escape(label)}</text>'
+            )
+    for node_id, node in nodes.items():
+        x, y, w, h = boxes[node_id]
+        radius = {"stadium": h / 2, "circle": h / 2, "cylinder": 10}.get(node["shape"], 4)
+        parts.append(
+            f'<rect x="{x:.1f}" y="{y:.1f}" width="{w:.1f}" height="{h:.1f}" rx="{radius:.1f}" fill="#eef2ff" stroke="#6366f1" stroke-width="1.5"/>'
+        )
+        parts.append(
+            f'<text x="{x + w / 2:.1f}" y="{y + h / 2 + 4:.1f}" text-anchor="middle" fill="#1e1b4b">{_xml_escape(node["label"])}</text>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+# 4. PDF Renderer (minimal PDF 1.4 writer, built-in Helvetica fonts)
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+
+def _pdf_text(text: str) -> str:
+    """
+    Encode text for a PDF string literal (WinAnsi; unsupported characters such as emoji are dropped)
+    """
+    encoded = text.encode("cp1252", errors="ignore").decode("latin-1")
+    return encoded.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _wrap(text: str, size: float, width: float) -> list[str]:
+    # Helvetica averages ~0.5em per character
+    max_chars = max(int(width / (size * 0.5)), 10)
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > max_chars:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines or [""]
+
+class _PdfPages:
+    """
+    Accumulates page content streams with a simple top-down text cursor
+    """
+
+    def __init__(self):
+        self.pages: list[list[str]] = []
+        self.new_page()
+
+    def new_page(self):
+        self.pages.append([])
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure_space(self, height: float):
+        if self.y - height < MARGIN:
+            self.new_page()
+
+    def text(self, text: str, size: float = 10, bold: bool = False, indent: float = 0, gap: float = 4):
+        font = "F2" if bold else "F1"
+        for line in _wrap(text, size, PAGE_WIDTH - 2 * MARGIN - indent):
+            self.ensure_space(size + gap)
+            self.y -= size + gap
+            self.pages[-1].append(f"BT /{font} {size} Tf {MARGIN + indent:.1f} {self.y:.1f} Td ({_pdf_text(line)}) Tj ET")
+
+    def spacer(self, height: float):
+        self.y -= height
+
+    def diagram(self, diagram: str):
+        is_valid, result = validate_mermaid_syntax(diagram)
+        if not is_valid:
+            self.text(f"Architecture diagram could not be generated: {result}", size=9)
+            return
+        nodes, edges = parse_mermaid_graph(result)
+        boxes, width, height = layout_graph(nodes, edges)
+        scale = min(1.0, (PAGE_WIDTH - 2 * MARGIN) / max(width, 1))
+        self.ensure_space(height * scale)
+        top = self.y
+        ox = MARGIN + (PAGE_WIDTH - 2 * MARGIN - width * scale) / 2
+
+        def point(x: float, y: float) -> tuple[float, float]:
+            # SVG-style top-down coordinates -> PDF bottom-up page coordinates
+            return ox + x * scale, top - y * scale
+
+        ops = self.pages[-1]
+        ops.append("0.39 0.45 0.55 RG 0.39 0.45 0.55 rg 1 w")
+        for src, dst, label in edges:
+            x1, y1, x2, y2 = _edge_points(boxes[src], boxes[dst])
+            (px1, py1), (px2, py2) = point(x1, y1), point(x2, y2)
+            ops.append(f"{px1:.1f} {py1:.1f} m {px2:.1f} {py2:.1f} l S")
+            head = [point(x, y) for x, y in _arrow_head(x1, y1, x2, y2)]
+            ops.append(f"{head[0][0]:.1f} {head[0][1]:.1f} m {head[1][0]:.1f} {head[1][1]:.1f} l {head[2][0]:.1f} {head[2][1]:.1f} l f")
+            if label:
+                lx, ly = point((x1 + x2) / 2 + 4, (y1 + y2) / 2)
+                ops.append(f"BT /F1 {8 * scale:.1f} Tf {lx:.1f} {ly:.1f} Td ({_pdf_text(label)}) Tj ET")
+        for node_id, node in nodes.items():
+            x, y, w, h = boxes[node_id]
+            px, py = point(x, y + h)
+            ops.append(f"0.93 0.95 1 rg 0.39 0.4 0.95 RG {px:.1f} {py:.1f} {w * scale:.1f} {h * scale:.1f} re B")
+            tx, ty = point(x + w / 2 - len(node["label"]) * 2.5, y + h / 2 + 3)
+            ops.append(f"0.12 0.11 0.29 rg BT /F1 {10 * scale:.1f} Tf {tx:.1f} {ty:.1f} Td ({_pdf_text(node['label'])}) Tj ET")
+        ops.append("0 0 0 rg 0 0 0 RG")
+        self.y = top - height * scale - 10
+
+    def stack(self, stack: dict):
+        for key, title in CATEGORY_TITLES:
+            items = stack.get(key) or []
+            if not items:
+                continue
+            self.text(title, size=12, bold=True, gap=8)
+            for item in items:
+                self.text(item.get("name", ""), size=11, bold=True, indent=8, gap=6)
+                for pro in item.get("pros") or []:
+                    self.text(f"+ {pro}", size=9, indent=16)
+                for con in item.get("cons") or []:
+                    self.text(f"- {con}", size=9, indent=16)
+                if item.get("why"):
+                    self.text(f"Why: {item['why']}", size=9, indent=16)
+
+    def to_bytes(self) -> bytes:
+        objects = [
+            "<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # Pages, filled below once page object numbers are known
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        ]
+        page_ids = []
+        for ops in self.pages:
+            content = "\n".join(ops).encode("latin-1")
+            objects.append(f"<< /Length {len(content)} >>\nstream\n{content.decode('latin-1')}\nendstream")
+            content_id = len(objects)
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>"
+            )
+            page_ids.append(len(objects))
+        objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+        xref = len(out)
+        out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+        for offset in offsets:
+            out += f"{offset:010d} 00000 n \n".encode("latin-1")
+        out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+        return bytes(out)
+
+def render_recommendation_pdf(recommendation: dict) -> bytes:
+    """
+    Render a RecommendationResponse (as a dict) to a PDF report
+    """
+    pdf = _PdfPages()
+    pdf.text("Tech Stack Recommendation", size=20, bold=True, gap=10)
+    pdf.spacer(6)
+    if recommendation.get("architecture_diagram"):
+        pdf.text("Architecture Diagram", size=14, bold=True, gap=10)
+        pdf.diagram(recommendation["architecture_diagram"])
+    pdf.text("Primary Technology Stack", size=14, bold=True, gap=12)
+    pdf.stack(recommendation.get("primary") or {})
+
+    explanations = recommendation.get("alternative_explanations") or []
+    for index, alt_stack in enumerate(recommendation.get("alternatives") or []):
+        explanation = explanations[index] if index < len(explanations) else {}
+        pdf.new_page()
+        pdf.text(f"Alternative Stack #{explanation.get('stack_num', index + 1)}", size=14, bold=True, gap=10)
+        for label, key in [("When to use", "when_to_use"), ("Trade-off", "trade_off"), ("Why consider", "why_consider")]:
+            if explanation.get(key):
+                pdf.text(f"{label}: {explanation[key]}", size=9)
+        pdf.spacer(4)
+        pdf.stack(alt_stack)
+    return pdf.to_bytes()
+
+# 5. Content-Addressed Render Cache
+RENDERERS = {
+    "svg": ("image/svg+xml", lambda rec: render_diagram_svg(rec.get("architecture_diagram", "")).encode("utf-8")),
+    "pdf": ("application/pdf", render_recommendation_pdf),
+}
+
+def render_artifact(fmt: str, recommendation: dict) -> bytes:
+    """
+    Top-level (picklable) entry point executed in the process pool
+    """
+    return RENDERERS[fmt][1](recommendation)
+
+def recommendation_hash(recommendation: dict) -> str:
+    """
+    Hash of the content that affects rendering (ids/meta excluded)
+    """
+    content = {key: recommendation.get(key) for key in ("architecture_diagram", "primary", "alternatives", "alternative_explanations")}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{RENDERER_VERSION}:{payload}".encode("utf-8")).hexdigest()
+
+class RenderService:
+    """
+    Renders artifacts in a process pool and caches them on disk by content hash
+    """
+
+    def __init__(self, cache_dir: Path, max_workers: int = 2, max_cache_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self.max_cache_bytes = max_cache_bytes
+        self._pool: ProcessPoolExecutor | None = None
+        self._cache_bytes: int | None = None  # running total, so only writes past the cap scan the directory
+        self._cache_lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Created lazily so importing the app doesn't spawn worker processes.
+        # "spawn" rather than fork: forking the multi-threaded server can copy locks held by other threads
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _scan_cache(self) -> list[tuple[float, int, Path]]:
+        artifacts = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix == ".tmp":
+                continue  # Artifact still being written
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            artifacts.append((stat.st_mtime, stat.st_size, path))
+        return artifacts
+
+    def _prune_cache(self):
+        """
+        Remove the least recently used artifacts until the cache fits in max_cache_bytes
+        (caller holds _cache_lock)
+        """
+        artifacts = self._scan_cache()
+        total = sum(size for _, size, _ in artifacts)
+        for _, size, path in sorted(artifacts):
+            if total <= self.max_cache_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._cache_bytes = total
+
+    def _read_cached(self, path: Path) -> bytes | None:
+        try:
+            content = path.read_bytes()
+            os.utime(path)  # mtime doubles as last-used time for pruning
+            return content
+        except OSError:
+            return None  # Not rendered yet, or pruned in the meantime
+
+    def _store(self, path: Path, content: bytes):
+        # Unique temp file per write so concurrent renders of the same content never share one,
+        # and readers never see a partial artifact
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=path.name + ".", suffix=".tmp", delete=False) as tmp:
+            tmp.write(content)
+        with self._cache_lock:
+            try:
+                replaced = path.stat().st_size  # A concurrent render of the same content got there first
+            except OSError:
+                replaced = 0
+            os.replace(tmp.name, path)
+            if self._cache_bytes is None:
+                self._cache_bytes = sum(size for _, size, _ in self._scan_cache())
+            else:
+                self._cache_bytes += len(content) - replaced
+            if self._cache_bytes > self.max_cache_bytes:
+                self._prune_cache()
+
+    async def render(self, fmt: str, recommendation: dict) -> tuple[bytes, str, str, bool]:
+        """
+        Returns (content, media_type, content_hash, cache_hit)
+        """
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unsupported render format: {fmt}")
+        media_type = RENDERERS[fmt][0]
+        content_hash = recommendation_hash(recommendation)
+        path = self.cache_dir / f"{content_hash}.{fmt}"
+        loop = asyncio.get_running_loop()
+        # Cache file I/O runs in the default thread pool, rendering in the process pool
+        content = await loop.run_in_executor(None, self._read_cached, path)
+        if content is not None:
+            return content, media_type, content_hash, True
+
+        content = await loop.run_in_executor(self._executor(), render_artifact, fmt, recommendation)
+        try:
+            await loop.run_in_executor(None, self._store, path, content)
+        except Exception as e:
+            print(f"Render cache write error for {content_hash}: {e}")
+        return content, media_type, content_hash, False
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,124 @@
+"""
+Per-Request Metrics
+
+Collects wall time per stage and LLM token usage per model for a single request.
+Reported to clients as an optional `meta` block and as a `Server-Timing` header,
+so latency and cost can be attributed without reading server logs. Every stage is
+also a tracing span of the current request.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from tracing import current_span, current_trace_id, tracer
+
+class RequestMetrics:
+    """
+    Stage timings and token usage for one request
+    """
+
+    def __init__(self, prompt_version: str = ""):
+        self.prompt_version = prompt_version
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}  # stage name -> wall time in ms (insertion ordered)
+        self.tokens: dict[str, dict] = {}  # label -> {prompt_tokens, completion_tokens, total_tokens, estimated}
+        self.models: dict[str, str] = {}  # label -> model name
+        self.cache_hit = False
+        self.similarity: dict | None = None  # {key, score, mode: "serve" | "seed"} for nearest-neighbor matches
+        self.stream_guard: dict | None = None  # StreamGuard.stats() of the streamed stack response
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block of work; repeated stages accumulate
+        """
+        start = time.perf_counter()
+        with tracer.span(name):
+            try:
+                yield
+            finally:
+                self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def record_usage(self, label: str, model_name: str, usage: dict, estimated: bool = False):
+        """
+        Add token usage for a label; `estimated` marks counts that were not reported by the provider
+        """
+        totals = self.tokens.setdefault(label, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "estimated": False})
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            totals[key] += int(usage.get(key) or 0)
+        totals["estimated"] = totals["estimated"] or estimated
+        self.models[label] = model_name
+
+    def total_tokens(self) -> int:
+        return sum(usage["total_tokens"] for usage in self.tokens.values())
+
+    def tokens_estimated(self) -> bool:
+        return any(usage["estimated"] for usage in self.tokens.values())
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def callbacks(self, label: str) -> dict:
+        """
+        LangChain config that records token usage of a chain call under `label`
+        """
+        return {"callbacks": [TokenUsageHandler(self, label)]}
+
+    def to_meta(self) -> dict:
+        return {
+            "total_ms": round(self.total_ms(), 1),
+            "stages_ms": {name: round(ms, 1) for name, ms in self.stages.items()},
+            "tokens": self.tokens,
+            "models": self.models,
+            "cache_hit": self.cache_hit,
+            "similarity": self.similarity,
+            "stream_guard": self.stream_guard,
+            "prompt_version": self.prompt_version,
+            "trace_id": current_trace_id(),
+        }
+
+    def server_timing_header(self) -> str:
+        """
+        Format as a Server-Timing header value (durations in ms)
+        """
+        entries = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        entries.append(f"total;dur={self.total_ms():.1f}")
+        entries.append(f'cache;desc="{"hit" if self.cache_hit else "miss"}"')
+        if self.similarity:
+            entries.append(f'similar;desc="{self.similarity["mode"]} score={self.similarity["score"]:.3f}"')
+        if self.stream_guard and self.stream_guard["stop_reason"]:
+            entries.append(f'early_stop;desc="{self.stream_guard["stop_reason"]} discarded={self.stream_guard["discarded_tokens"]}"')
+        for label, usage in self.tokens.items():
+            entries.append(
+                f'tokens_{label};desc="{self.models.get(label, "")} '
+                f'prompt={usage["prompt_tokens"]} completion={usage["completion_tokens"]}'
+                f'{" estimated" if usage["estimated"] else ""}"'
+            )
+        if self.prompt_version:
+            entries.append(f'prompt_version;desc="{self.prompt_version}"')
+        return ", ".join(entries)
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """
+    Records the token usage reported by the chat model (llm_output["token_usage"])
+    """
+    run_inline = True
+
+    def __init__(self, metrics: RequestMetrics, label: str):
+        self.metrics = metrics
+        self.label = label
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        llm_output = response.llm_output or {}
+        usage = llm_output.get("token_usage") or {}
+        self.metrics.record_usage(self.label, llm_output.get("model_name", ""), usage)
+        # Runs inline, so the current span is the stage wrapping the chain call
+        current_span().set_attributes({
+            "llm.chain": f"{self.label}_chain",
+            "llm.model": llm_output.get("model_name"),
+            "llm.prompt_tokens": usage.get("prompt_tokens"),
+            "llm.completion_tokens": usage.get("completion_tokens"),
+        })
@@ -0,0 +1,460 @@
+"""
+Response Parser
+
+Parses the stack model's markdown response into structured models and sanitizes /
+validates the embedded Mermaid diagrams. This is the CPU hot path of /api/recommend
+and has no LLM dependencies, so it can be benchmarked on its own (see parse_benchmark.py).
+"""
+import re
+from pydantic import BaseModel, model_serializer
+
+from tracing import tracer
+
+# 1. Response Models
+class TechItem(BaseModel):
+    name: str
+    pros: list[str] = []
+    cons: list[str] = []
+    why: str = ""
+    logo: str = ""  # Key into frontend/lib/techLogos.ts (filled from the knowledge base)
+
+class TechStack(BaseModel):
+    frontend: list[TechItem] = []
+    backend: list[TechItem] = []
+    database: list[TechItem] = []
+    devops: list[TechItem] = []
+    additional: list[TechItem] = []
+
+class RecommendationResponse(BaseModel):
+    architecture_diagram: str
+    primary: TechStack
+    alternatives: list[TechStack] = []
+    alternative_explanations: list[dict] = []  # {stack_num, when_to_use, trade_off, why_consider}
+    recommendation_id: str = ""  # Cache key of this recommendation, used by /api/refine
+    meta: dict | None = None  # Timing/token usage, only set when the client asks for it (?meta=true)
+
+    @model_serializer(mode="wrap")
+    def _omit_unset_meta(self, handler):
+        # The routes return either this model or an error dict, so response_model_exclude_none is not an option
+        data = handler(self)
+        if data.get("meta") is None:
+            data.pop("meta", None)
+        return data
+
+# 2. Mermaid Sanitizer and Validator
+def sanitize_mermaid_code(code: str) -> str:
+    """
+    Clean up mermaid code to fix common generation issues
+    """
+    lines = []
+    for line in code.split('\n'):
+        # Strip leading/trailing whitespace
+        line = line.strip()
+        if not line or line.startswith('graph'):
+            if line:
+                lines.append(line)
+            continue
+        
+        # SKIP completely incomplete arrows - these will break mermaid anyway
+        # Skip: A -->|Label| (no target) 
+        if line.endswith('-->|') or line.endswith('-->') or re.search(r'-->\|[^|]*\|?\s*$', line):
+            # Incomplete arrow, skip it
+            continue
+        
+        # Fix unclosed brackets - add closing bracket if needed
+        # Pattern: NodeID[Label without closing bracket (not on arrow lines)
+        if '[' in line and ']' not in line and '-->' not in line:
+            line = line + ']'
+        
+        # For arrow lines with unclosed brackets in target
+        # Pattern: A -->|Label| B[ should become A -->|Label| B[]
+        if '-->' in line and '[' in line and ']' not in line:
+            # Only add bracket if the line ends with an incomplete bracket
+            if line.rstrip().endswith('['):
+                line = line + ']'
+            # But if it has content after bracket that's not valid, skip the line
+            elif not re.search(r'\[[a-zA-Z0-9_]*\]', line):
+                # Can't fix this, skip it
+                continue
+        
+        # Fix spaces in node labels - replace spaces with underscores in brackets
+        # Pattern: NodeID[Label With Spaces] -> NodeID[Label_With_Spaces]
+        line = re.sub(r'(\[)([^\]]+)(\])', 
+                      lambda m: m.group(1) + m.group(2).replace(' ', '_') + m.group(3), 
+                      line)
+        
+        # Fix spaces in arrow labels - replace spaces with underscores
+        # Pattern: -->|Label With Spaces| -> -->|Label_With_Spaces|
+        line = re.sub(r'(\|)([^\|]+)(\|)', 
+                      lambda m: m.group(1) + m.group(2).replace(' ', '_') + m.group(3), 
+                      line)
+        
+        # Verify line is valid after processing
+        # Must have balanced brackets and pipes if this is an arrow
+        if '-->' in line:
+            # Arrow line - must have target node or be removed
+            if not re.search(r'-->\s*[a-zA-Z0-9_]+\[\w*\]', line) and not re.search(r'-->\|[^|]+\|\s*[a-zA-Z0-9_]+', line):
+                # Can't find valid target node, skip this line
+                continue
+        
+        lines.append(line)
+    
+    return '\n'.join(lines)
+
+def validate_mermaid_syntax(code: str) -> tuple[bool, str]:
+    """
+    Validate mermaid diagram syntax and return (is_valid, error_message)
+    """
+    with tracer.span("mermaid.validate", **{"diagram.length": len(code or "")}) as span:
+        is_valid, result = _check_mermaid_syntax(code)
+        span.set_attribute("mermaid.valid", is_valid)
+        if not is_valid:
+            span.set_attribute("mermaid.error", result)
+        return is_valid, result
+
+def _check_mermaid_syntax(code: str) -> tuple[bool, str]:
+    if not code or len(code.strip()) < 10:
+        return False, "Code too short"
+    
+    # Sanitize first
+    code = sanitize_mermaid_code(code)
+    lines = code.strip().split('\n')
+    
+    # Check if starts with graph TD
+    if not any('graph TD' in line for line in lines[:3]):
+        return False, "Must start with 'graph TD'"
+    
+    # Check for bracket matching - count brackets per line
+    for line in lines:
+        if line.strip() and not line.strip().startswith('graph'):
+            open_brackets = line.count('[')
+            close_brackets = line.count(']')
+            if open_brackets != close_brackets:
+                return False, f"Unmatched brackets in line: {line[:40]}"
+            
+            open_pipes = line.count('|')
+            if open_pipes > 0 and open_pipes % 2 != 0:
+                return False, f"Unmatched pipes in arrow label: {line[:40]}"
+    
+    # Check for invalid arrow patterns
+    invalid_patterns = [
+        (r'--\.-+', 'Dotted arrows not allowed'),
+        (r'-+\|>', 'Special arrowheads not allowed'),
+        (r'===+>', 'Thick arrows not allowed'),
+        (r'-->+\*', 'Invalid symbols in arrows'),
+        (r'\]\[', 'Consecutive brackets error'),
+        (r'-->\|\s*$', 'Incomplete arrow statement'),
+        (r'-->\|$', 'Missing arrow label target'),
+    ]
+    
+    for pattern, reason in invalid_patterns:
+        if re.search(pattern, code, re.MULTILINE):
+            return False, reason
+    
+    # Check for HTML entities
+    if '&lt;' in code or '&gt;' in code or '&amp;' in code:
+        return False, "HTML entities not allowed"
+    
+    # Check for spaces in node IDs (should be underscores)
+    # Valid: NodeID[Label] or -->|Label_Text|
+    # Invalid: Node ID[Label] or -->|Label Text|
+    # (a single whitespace char is enough - `\s+\[` backtracks quadratically on long runs)
+    if re.search(r'\s\[', code):
+        return False, "Spaces in node definitions"
+    
+    # Check node definitions exist
+    node_pattern = r'[a-zA-Z0-9_]+\['
+    if not re.search(node_pattern, code):
+        return False, "No valid nodes found"
+    
+    # Check connections exist
+    arrow_pattern = r'-->'
+    if not re.search(arrow_pattern, code):
+        return False, "No valid connections found"
+    
+    return True, code
+
+
+# 3. Parse response into structured format
+def parse_tech_stack_response(response: str) -> RecommendationResponse:
+    """
+    Parse the LLM response into a structured RecommendationResponse
+    """
+    print(f"\n=== PARSE START: Response length {len(response)} ===")
+    print(f"First 500 chars:\n{response[:500]}\n")
+    
+    # Extract architecture diagram
+    with tracer.span("parse.diagram") as span:
+        mermaid_match = re.search(r'```mermaid\n(.*?)\n```', response, re.DOTALL)
+        diagram = mermaid_match.group(1) if mermaid_match else ""
+        span.set_attribute("diagram.length", len(diagram))
+    
+    # Extract PRIMARY stack
+    with tracer.span("parse.primary") as span:
+        primary_match = re.search(r'## PRIMARY Technology Stack\n(.*?)(?=## ALTERNATIVE|$)', response, re.DOTALL)
+        primary_text = primary_match.group(1) if primary_match else ""
+        print(f"\n=== PRIMARY section length: {len(primary_text)} ===")
+        print(f"PRIMARY first 300 chars:\n{primary_text[:300]}\n")
+        primary_stack = parse_stack_section(primary_text)
+        span.set_attribute("section.length", len(primary_text))
+    
+    # Extract alternatives
+    alternatives = []
+    alternative_explanations = []
+    # Debug: Check if response contains ALTERNATIVE STACK markers
+    if '## ALTERNATIVE STACK' in response:
+        print("✓ Response contains ALTERNATIVE STACK markers")
+    else:
+        print("✗ Response MISSING ALTERNATIVE STACK markers!")
+        print(f"  Response content preview:\n{response[-500:]}")
+    
+    alt_sections = split_alternative_sections(response)
+    print(f"Found {len(alt_sections)} alternative stacks")
+    
+    for stack_num, alt_text in alt_sections:
+        with tracer.span("parse.alternative", **{"stack_num": stack_num, "section.length": len(alt_text)}):
+            alt_stack, explanation = parse_alternative_section(stack_num, alt_text)
+        alternative_explanations.append(explanation)
+        alternatives.append(alt_stack)
+    
+    return RecommendationResponse(
+        architecture_diagram=diagram,
+        primary=primary_stack,
+        alternatives=alternatives,
+        alternative_explanations=alternative_explanations
+    )
+
+ALT_HEADER_PATTERN = re.compile(r'## ALTERNATIVE STACK #(\d+)[:\s]')
+ALT_BOUNDARY_PATTERN = re.compile(r'## ALTERNATIVE STACK #\d+')
+
+def split_alternative_sections(response: str) -> list[tuple[int, str]]:
+    """
+    Split the response into (stack_num, section_text) for each "## ALTERNATIVE STACK #N" header.
+    The header line may carry text after the number (e.g., ": Cost-Effective MVP").
+    
+    Equivalent to finditer over
+    r'## ALTERNATIVE STACK #(\d+)[:\s][^\n]*\n(.*?)(?=## ALTERNATIVE STACK #\d+|$)' (DOTALL),
+    but linear: that regex rescans to the end of the response from every header without a newline.
+    """
+    sections = []
+    pos = 0
+    for header in ALT_HEADER_PATTERN.finditer(response):
+        if header.start() < pos:
+            continue
+        line_end = response.find('\n', header.end())
+        if line_end == -1:
+            break
+        body_start = line_end + 1
+        boundary = ALT_BOUNDARY_PATTERN.search(response, body_start)
+        if boundary:
+            body_end = boundary.start()
+        else:
+            # `$` also matches right before a trailing newline
+            body_end = len(response) - 1 if response.endswith('\n') else len(response)
+            body_end = max(body_end, body_start)
+        sections.append((int(header.group(1)), response[body_start:body_end]))
+        pos = body_end
+    return sections
+
+def parse_alternative_section(stack_num: int, alt_text: str) -> tuple[TechStack, dict]:
+    """
+    Parse one alternative stack section into its TechStack and explanation dict
+    """
+    print(f"\n=== ALTERNATIVE STACK #{stack_num} ===")
+    print(f"Alt text length: {len(alt_text)}")
+    print(f"Alt text first 200 chars:\n{alt_text[:200]}\n")
+    
+    # Extract explanation lines
+    when_match = re.search(r'\*\*When to use this stack:\*\*\s*(.+?)(?:\n\n|\*\*)', alt_text, re.DOTALL)
+    trade_match = re.search(r'\*\*Primary trade-off vs recommended stack:\*\*\s*(.+?)(?:\n\n|\*\*)', alt_text, re.DOTALL)
+    # Without a terminator the lazy match rescans to the end from every label occurrence
+    why_match = re.search(r'\*\*Why this option is worth considering:\*\*\s*(.+?)(?:\n\n###)', alt_text, re.DOTALL) if '\n\n###' in alt_text else None
+    
+    when_text = when_match.group(1).strip() if when_match else ""
+    trade_text = trade_match.group(1).strip() if trade_match else ""
+    why_text = why_match.group(1).strip() if why_match else ""
+    
+    print(f"When to use: {when_text[:100]}")
+    print(f"Trade off: {trade_text[:100]}")
+    print(f"Why consider: {why_text[:100]}\n")
+    
+    explanation = {
+        "stack_num": stack_num,
+        "when_to_use": when_text,
+        "trade_off": trade_text,
+        "why_consider": why_text
+    }
+    
+    alt_stack = parse_stack_section(alt_text)
+    print(f"Parsed alternative #{stack_num}: Frontend={len(alt_stack.frontend)}, Backend={len(alt_stack.backend)}, DB={len(alt_stack.database)}")
+    return alt_stack, explanation
+
+def parse_stack_section(text: str) -> TechStack:
+    """
+    Parse a single tech stack section (PRIMARY or ALTERNATIVE)
+    More robust parsing with better error handling
+    """
+    stack = TechStack()
+    lines = text.split('\n')
+    current_category = None
+    current_tech = None
+    parsing_mode = None  # 'pros', 'cons', or 'why'
+    
+    print(f"\n=== PARSING STACK SECTION: {len(lines)} lines ===")
+    
+    for i, line in enumerate(lines):
+        line_stripped = line.strip()
+        if not line_stripped:
+            parsing_mode = None
+            continue
+        
+        # Skip explanation lines and examples
+        if any(kw in line_stripped for kw in ['When to use', 'Primary trade-off', 'Why this option', 'EXAMPLE']):
+            parsing_mode = None
+            continue
+        
+        # Detect category (###)
+        if line_stripped.startswith('### '):
+            # Save previous tech if exists
+            if current_tech and current_category:
+                cat_list = getattr(stack, current_category)
+                cat_list.append(current_tech)
+                print(f"  Added {current_tech.name} to {current_category}")
+            current_tech = None
+            parsing_mode = None
+            
+            # Identify new category
+            if 'Frontend' in line_stripped:
+                current_category = 'frontend'
+            elif 'Backend' in line_stripped:
+                current_category = 'backend'
+            elif 'Database' in line_stripped:
+                current_category = 'database'
+            elif 'DevOps' in line_stripped or 'Infrastructure' in line_stripped:
+                current_category = 'devops'
+            elif 'Additional' in line_stripped:
+                current_category = 'additional'
+            else:
+                current_category = None
+            
+            if current_category:
+                print(f"  Category: {current_category}")
+            continue
+        
+        # Extract tech name - look for **TechName** with dash and emoji/description
+        if line_stripped.startswith('**') and ' - ' in line_stripped and current_category:
+            # Save previous tech
+            if current_tech and current_category:
+                cat_list = getattr(stack, current_category)
+                cat_list.append(current_tech)
+            
+            # Match: **TechName** - emoji/description
+            match = re.search(r'\*\*([^*]+)\*\*\s*-\s*(.+)$', line_stripped)
+            if match:
+                tech_name = match.group(1).strip()
+                current_tech = TechItem(name=tech_name)
+                parsing_mode = None
+                print(f"    Found tech: {tech_name}")
+            continue
+        
+        # Section headers (case-insensitive)
+        if line_stripped.lower() == 'pros:' and current_tech:
+            parsing_mode = 'pros'
+            continue
+        
+        if line_stripped.lower() == 'cons:' and current_tech:
+            parsing_mode = 'cons'
+            continue
+        
+        if line_stripped.lower().startswith('why:') and current_tech:
+            # Extract inline why if exists
+            why_match = re.search(r'^why:\s*(.+)$', line_stripped, re.IGNORECASE)
+            if why_match and why_match.group(1):
+                current_tech.why = why_match.group(1).strip()
+                parsing_mode = None
+            else:
+                parsing_mode = 'why'
+            continue
+        
+        # Example blocks - skip them
+        if 'EXAMPLE' in line_stripped or 'example' in line_stripped:
+            parsing_mode = None
+            continue
+        
+        # Bullet point handling
+        if line_stripped.startswith('•') and current_tech:
+            bullet_text = line_stripped[1:].strip()
+            # Remove bold markers
+            bullet_text = re.sub(r'\*\*([^*]+)\*\*:\s*', '', bullet_text)
+            # Remove trailing punctuation except period in middle
+            bullet_text = re.sub(r'[,;]\s*$', '', bullet_text)
+            bullet_text = bullet_text.strip()
+            
+            if parsing_mode == 'pros' and bullet_text:
+                current_tech.pros.append(bullet_text)
+            elif parsing_mode == 'cons' and bullet_text:
+                current_tech.cons.append(bullet_text)
+            continue
+        
+        # Multi-line why continuation
+        if parsing_mode == 'why' and current_tech and line_stripped:
+            # Stop at next section
+            if line_stripped.startswith('###') or (line_stripped.startswith('**') and ' - ' in line_stripped):
+                parsing_mode = None
+                # Re-process this line as new category/tech
+                if line_stripped.startswith('### '):
+                    if 'Frontend' in line_stripped:
+                        current_category = 'frontend'
+                    elif 'Backend' in line_stripped:
+                        current_category = 'backend'
+                    elif 'Database' in line_stripped:
+                        current_category = 'database'
+                    elif 'DevOps' in line_stripped or 'Infrastructure' in line_stripped:
+                        current_category = 'devops'
+                    elif 'Additional' in line_stripped:
+                        current_category = 'additional'
+                    current_tech = None
+                continue
+            # Accumulate why
+            current_tech.why += ' ' + line_stripped
+            continue
+        
+        # Stop parsing sections when encountering new markers
+        if line_stripped.startswith('###') and parsing_mode:
+            parsing_mode = None
+    
+    # Don't forget the last tech
+    if current_tech and current_category:
+        cat_list = getattr(stack, current_category)
+        cat_list.append(current_tech)
+        print(f"  Added final {current_tech.name} to {current_category}")
+    
+    # Debug output
+    total_techs = len(stack.frontend) + len(stack.backend) + len(stack.database) + len(stack.devops) + len(stack.additional)
+    print(f"  PARSED TOTAL: {total_techs} technologies")
+    print(f"    Frontend: {len(stack.frontend)}, Backend: {len(stack.backend)}, Database: {len(stack.database)}, DevOps: {len(stack.devops)}, Additional: {len(stack.additional)}")
+    
+    return stack
+
+# 4. Extract and validate mermaid code from a full response
+def process_response_stream(text: str) -> str:
+    """
+    Extract mermaid blocks, validate them, and return cleaned response
+    """
+    # Find mermaid code blocks
+    mermaid_pattern = r'```mermaid\n(.*?)\n```'
+    matches = re.finditer(mermaid_pattern, text, re.DOTALL)
+    
+    cleaned_text = text
+    for match in matches:
+        mermaid_code = match.group(1)
+        is_valid, message = validate_mermaid_syntax(mermaid_code)
+        
+        if not is_valid:
+            # Replace invalid mermaid block with error message
+            cleaned_text = cleaned_text.replace(
+                match.group(0),
+                f"```\n⚠️ Architecture diagram could not be generated.\nReason: {message}\n```"
+            )
+    
+    return cleaned_text
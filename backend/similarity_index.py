@@ -0,0 +1,261 @@
+"""
+Similarity Index
+
+Nearest-neighbor retrieval of past recommendations for requests that are not an
+exact cache hit (e.g. reworded customConstraints, another team size or budget).
+
+Embedding similarity cannot tell "must integrate with Stripe" from "must not integrate
+with Stripe", so a neighbor is only served as-is when `is_equivalent_request` holds:
+identical normalized structured fields, and customConstraints that differ at most in
+case, whitespace or trailing punctuation ("Must integrate with Stripe." vs "must
+integrate with stripe"). Any other neighbor, including one whose field values are
+merely worded differently ("Small (2-5)" vs "Small (2-5 people)"), is only used as a
+few-shot seed.
+
+- Embeddings come from a small local model: feature hashing of per-field word tokens
+  and character trigrams (no downloads, deterministic, <1ms per request).
+- The index is a flat (brute-force) inner-product index over L2-normalized vectors,
+  which is exact and fast enough for the size of this dataset.
+
+Usage (index build/query benchmark):
+    python similarity_index.py --benchmark --sizes 1000 10000 50000
+"""
+import argparse
+import hashlib
+import random
+import sys
+import time
+
+import numpy as np
+
+from recommendation_cache import normalize_inputs
+
+# Relative importance of each field in the embedding
+FIELD_WEIGHTS = {
+    "appType": 3.0,
+    "scale": 2.0,
+    "focus": 2.0,
+    "teamSize": 1.0,
+    "budget": 1.5,
+    "timeToMarket": 1.0,
+    "securityLevel": 1.5,
+    "customConstraints": 1.5,
+}
+
+# 1. Local Embedding Model
+class HashingEmbedder:
+    """
+    Feature-hashing embedder over request fields (word tokens + char trigrams per field)
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        # Signed hashing keeps collisions from always adding up
+        return value % self.dim, 1.0 if (value >> 63) & 1 else -1.0
+
+    def embed(self, inputs: dict) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for field, value in normalize_inputs(inputs).items():
+            if not value:
+                continue
+            features = [f"{field}:w:{word}" for word in value.replace(",", " ").split()]
+            padded = f" {value} "
+            features += [f"{field}:c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+            # Each field contributes the same total weight regardless of its length
+            field_vector = np.zeros(self.dim, dtype=np.float32)
+            for feature in features:
+                index, sign = self._bucket(feature)
+                field_vector[index] += sign
+            norm = np.linalg.norm(field_vector)
+            if norm > 0:
+                vector += FIELD_WEIGHTS.get(field, 1.0) * field_vector / norm
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+# 2. Flat Inner-Product Index
+class FlatIndex:
+    """
+    Brute-force cosine similarity index (vectors are L2-normalized)
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.keys: list[str] = []
+        self._positions: dict[str, int] = {}
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: str, vector: np.ndarray):
+        if key in self._positions:
+            self._matrix[self._positions[key]] = vector
+            return
+        if self._size == len(self._matrix):
+            # Grow geometrically so repeated adds stay amortized O(1)
+            grown = np.zeros((max(64, 2 * len(self._matrix)), self.dim), dtype=np.float32)
+            grown[: self._size] = self._matrix[: self._size]
+            self._matrix = grown
+        self._matrix[self._size] = vector
+        self._positions[key] = self._size
+        self.keys.append(key)
+        self._size += 1
+
+    def add_batch(self, keys: list[str], vectors: np.ndarray):
+        for key, vector in zip(keys, vectors):
+            self.add(key, vector)
+
+    def search(self, vector: np.ndarray, k: int = 1) -> list[tuple[str, float]]:
+        if not self._size:
+            return []
+        scores = self._matrix[: self._size] @ vector
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.keys[i], float(scores[i])) for i in top]
+
+# 3. Retriever over the Recommendation Cache
+class SimilarityRetriever:
+    """
+    Finds the most similar past request in the recommendation cache
+    """
+
+    def __init__(self, embedder: HashingEmbedder | None = None):
+        self.embedder = embedder or HashingEmbedder()
+        self.index = FlatIndex(self.embedder.dim)
+
+    def add(self, key: str, inputs: dict):
+        self.index.add(key, self.embedder.embed(inputs))
+
+    def build_from_cache(self, cache) -> int:
+        """
+        (Re)build the index from every entry stored in a RecommendationCache
+        """
+        count = 0
+        for entry in cache.iter_entries():
+            if entry.get("source") == "refine":
+                continue  # Partial refinements mix answers for two sets of inputs
+            self.add(entry["key"], entry.get("inputs") or {})
+            count += 1
+        return count
+
+    def nearest(self, inputs: dict, k: int = 1, exclude: str | None = None) -> list[tuple[str, float]]:
+        results = self.index.search(self.embedder.embed(inputs), k + (1 if exclude else 0))
+        return [(key, score) for key, score in results if key != exclude][:k]
+
+def format_seed(response: dict) -> str:
+    """
+    Few-shot seed: the primary stack of a very similar past request, appended to the custom prompt
+    """
+    primary = response.get("primary") or {}
+    lines = []
+    for category, title in [("frontend", "Frontend"), ("backend", "Backend"), ("database", "Database"),
+                            ("devops", "DevOps/Infrastructure"), ("additional", "Additional Services")]:
+        names = [item.get("name", "") for item in primary.get(category) or []]
+        if names:
+            lines.append(f"- {title}: {', '.join(names)}")
+    if not lines:
+        return ""
+    return (
+        "REFERENCE: A very similar project was recently recommended this PRIMARY stack:\n"
+        + "\n".join(lines)
+        + "\nReuse these choices where they still fit this project's constraints and focus your reasoning on what is different."
+    )
+
+def constraint_signature(text: str) -> str:
+    """
+    customConstraints with case, whitespace and trailing punctuation differences removed.
+    Everything else is kept, including operators ("latency < 100ms" vs "latency > 100ms").
+    """
+    return " ".join((text or "").lower().split()).rstrip(" .,;:!?")
+
+def is_equivalent_request(a: dict, b: dict) -> bool:
+    """
+    Same normalized structured fields and the same constraint text up to case, whitespace and trailing punctuation
+    """
+    norm_a, norm_b = normalize_inputs(a), normalize_inputs(b)
+    return all(
+        constraint_signature(norm_a[field]) == constraint_signature(norm_b[field]) if field == "customConstraints"
+        else norm_a[field] == norm_b[field]
+        for field in norm_a
+    )
+
+# 4. Benchmark
+BENCHMARK_OPTIONS = {
+    "appType": ["E-commerce", "SaaS", "Mobile App", "Social Network", "Marketplace", "Analytics", "Gaming", "Healthcare", "Finance", "Education"],
+    "scale": ["MVP (1K-10K users)", "Growth (10K-100K users)", "Scale (100K-1M users)", "Enterprise (1M+ users)"],
+    "focus": ["Cost Optimization", "Performance", "Security", "Scalability", "Time to Market", "Developer Experience"],
+    "teamSize": ["Solo (1 person)", "Small (2-5)", "Medium (5-10)", "Large (10-20)"],
+    "budget": ["Minimal (<$1K)", "Small ($1K-$5K)", "Medium ($5K-$20K)", "Large ($20K-$100K)"],
+    "timeToMarket": ["ASAP (1-2 weeks)", "Quick (1-2 months)", "Moderate (3-6 months)"],
+    "securityLevel": ["Standard", "SOC 2", "GDPR", "HIPAA", "PCI-DSS"],
+}
+BENCHMARK_CONSTRAINTS = ["", "must integrate with Stripe", "need realtime chat", "we already use AWS", "offline support for mobile", "multi-tenant with SSO"]
+
+def random_inputs(rng: random.Random) -> dict:
+    inputs = {field: rng.choice(values) for field, values in BENCHMARK_OPTIONS.items()}
+    inputs["focus"] = ", ".join(rng.sample(BENCHMARK_OPTIONS["focus"], rng.randint(1, 3)))
+    inputs["customConstraints"] = rng.choice(BENCHMARK_CONSTRAINTS)
+    return inputs
+
+def run_benchmark(sizes: list[int], queries: int = 200, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    embedder = HashingEmbedder()
+    rows = []
+    for size in sizes:
+        requests = [random_inputs(rng) for _ in range(size)]
+
+        start = time.perf_counter()
+        vectors = np.stack([embedder.embed(inputs) for inputs in requests])
+        embed_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = FlatIndex(embedder.dim)
+        index.add_batch([str(i) for i in range(size)], vectors)
+        build_s = time.perf_counter() - start
+
+        query_inputs = [random_inputs(rng) for _ in range(queries)]
+        latencies = []
+        for inputs in query_inputs:
+            start = time.perf_counter()
+            index.search(embedder.embed(inputs), k=5)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+
+        # Sanity check: a reworded constraint should still retrieve its original request
+        probe = dict(requests[0], customConstraints=requests[0]["customConstraints"] + " please")
+        top_key, top_score = index.search(embedder.embed(probe), k=1)[0]
+
+        rows.append({
+            "size": size,
+            "embed_ms_per_item": round(embed_s * 1000 / size, 3),
+            "build_ms": round(build_s * 1000, 1),
+            "query_p50_ms": round(latencies[len(latencies) // 2], 3),
+            "query_p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+            "reworded_probe_score": round(top_score, 3),
+        })
+    return rows
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Similarity index benchmark")
+    parser.add_argument("--benchmark", action="store_true", help="Run the index build/query benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        parser.print_help()
+        return 0
+    rows = run_benchmark(args.sizes, args.queries)
+    columns = list(rows[0].keys())
+    print("  ".join(f"{column:>20}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]:>20}" for column in columns))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
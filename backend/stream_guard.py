@@ -0,0 +1,168 @@
+"""
+Streaming Output Guard
+
+Follows the structure of a stack recommendation while it is streamed and tells the
+caller when to stop the generation:
+
+- complete:          the last expected ALTERNATIVE STACK is finished (the next "##" header,
+                     or a "###" header after its Additional Services, is not kept)
+- repeated_section:  a PRIMARY/ALTERNATIVE header that was already generated
+- extra_alternative: an ALTERNATIVE STACK number that was not asked for (e.g. a fourth one)
+- unexpected_primary: a PRIMARY section when only alternatives were asked for (refinement)
+- section_budget:    a section (diagram, PRIMARY, one alternative) exceeded its token budget
+- mermaid_budget:    a Mermaid block exceeded its token budget
+
+Token counts are estimates (~4 characters per token), since streamed responses carry no usage.
+"""
+import re
+
+# Per-section token budgets, several times the size of a normal section
+SECTION_TOKEN_BUDGETS = {
+    "diagram": 800,
+    "primary": 2500,
+    "alternative": 1500,
+}
+MERMAID_TOKEN_BUDGET = 600
+
+PRIMARY_HEADER_PATTERN = re.compile(r'## PRIMARY Technology Stack')
+ALT_HEADER_PATTERN = re.compile(r'## ALTERNATIVE STACK #(\d+)')
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate (~4 characters per token)
+    """
+    return len(text) // 4
+
+class StreamGuard:
+    """
+    Incremental section tracker for one streamed stack response
+    """
+
+    def __init__(self, expected_alternatives: set[int] | None = None, expect_primary: bool = True,
+                 max_tokens: int | None = None, section_budgets: dict | None = None,
+                 mermaid_budget: int = MERMAID_TOKEN_BUDGET):
+        self.expected_alternatives = set(expected_alternatives or {1, 2, 3})
+        self.expect_primary = expect_primary
+        self.max_tokens = max_tokens
+        self.section_budgets = {**SECTION_TOKEN_BUDGETS, **(section_budgets or {})}
+        self.mermaid_budget = mermaid_budget
+
+        self.chunks: list[str] = []
+        self._line = ""  # incomplete line carried between chunks
+        self._length = 0  # characters received so far
+        self._cut: int | None = None  # where to truncate the response (start of the offending line)
+        self.section = "diagram"  # everything before the first stack header
+        self.section_chars: dict[str, int] = {}
+        self.seen_sections: set[str] = set()
+        self.in_mermaid = False
+        self.mermaid_chars = 0
+        self.last_category = ""
+        self.stop_reason: str | None = None
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_reason is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Add a streamed chunk; returns True when the generation should stop
+        """
+        if self.stopped:
+            return True
+        line_start = self._length - len(self._line)
+        self.chunks.append(chunk)
+        self._length += len(chunk)
+        self.section_chars[self.section] = self.section_chars.get(self.section, 0) + len(chunk)
+        if self.in_mermaid:
+            self.mermaid_chars += len(chunk)
+
+        lines = (self._line + chunk).split("\n")
+        self._line = lines.pop()
+        for line in lines:
+            self._check_line(line.strip(), line_start)
+            if self.stopped:
+                return True
+            line_start += len(line) + 1
+        self._check_budgets()
+        return self.stopped
+
+    def _stop(self, reason: str, cut: int | None = None):
+        self.stop_reason = reason
+        self._cut = cut
+
+    def _enter(self, section: str, line_start: int):
+        if section in self.seen_sections:
+            self._stop("repeated_section", line_start)
+            return
+        self.seen_sections.add(section)
+        # Everything from the header line on was counted on the previous section
+        moved = self._length - line_start
+        self.section_chars[self.section] -= moved
+        self.section_chars[section] = self.section_chars.get(section, 0) + moved
+        self.section = section
+        self.last_category = ""
+
+    def _check_line(self, line: str, line_start: int):
+        if line.startswith("```"):
+            self.in_mermaid = line.startswith("```mermaid") and not self.in_mermaid
+            self.mermaid_chars = self._length - line_start if self.in_mermaid else 0
+            return
+
+        last_alternative = max(self.expected_alternatives) if self.expected_alternatives else None
+        if self.section == f"alternative_{last_alternative}":
+            # The last expected alternative is complete once anything follows its final category
+            if line.startswith("## ") or line.startswith("# ") or (
+                line.startswith("### ") and self.last_category == "additional services"
+            ):
+                self._stop("complete", line_start)
+                return
+
+        alt_match = ALT_HEADER_PATTERN.match(line)
+        if alt_match:
+            stack_num = int(alt_match.group(1))
+            if stack_num not in self.expected_alternatives:
+                self._stop("extra_alternative", line_start)
+            else:
+                self._enter(f"alternative_{stack_num}", line_start)
+        elif PRIMARY_HEADER_PATTERN.match(line):
+            if not self.expect_primary:
+                self._stop("unexpected_primary", line_start)
+            else:
+                self._enter("primary", line_start)
+        elif line.startswith("### "):
+            self.last_category = line[4:].strip().lower()
+
+    def _check_budgets(self):
+        budget_key = "alternative" if self.section.startswith("alternative_") else self.section
+        budget = self.section_budgets.get(budget_key)
+        if budget is not None and self.section_chars.get(self.section, 0) // 4 > budget:
+            self._stop("section_budget")
+        elif self.in_mermaid and self.mermaid_chars // 4 > self.mermaid_budget:
+            self._stop("mermaid_budget")
+
+    @property
+    def text(self) -> str:
+        text = "".join(self.chunks)
+        return text[: self._cut] if self._cut is not None else text
+
+    @property
+    def generated_tokens(self) -> int:
+        return estimate_tokens("".join(self.chunks))
+
+    def stats(self) -> dict:
+        """
+        Summary for metrics/logs. discarded_tokens were generated (and billed) before the cut
+        and then dropped from the response, so they are waste, not a saving. The saving is the
+        part of max_tokens left unspent by stopping early; tokens_saved_upper_bound is that
+        unspent budget, an upper bound rather than a measurement.
+        """
+        generated = self.generated_tokens
+        upper_bound = max(0, self.max_tokens - generated) if self.stopped and self.max_tokens else 0
+        return {
+            "stop_reason": self.stop_reason,
+            "section": self.section,
+            "generated_tokens": generated,
+            "discarded_tokens": generated - estimate_tokens(self.text),
+            "tokens_saved_upper_bound": upper_bound,
+            "section_tokens": {name: chars // 4 for name, chars in self.section_chars.items() if chars > 0},
+        }
@@ -0,0 +1,369 @@
+"""
+Request Tracing
+
+Request-scoped spans in the OpenTelemetry data model, without an external collector:
+
+- A trace is started per HTTP request (or warm-up job). The trace ID comes from the
+  W3C `traceparent` header sent by the frontend, or is generated.
+- Nested spans (LLM chains, parsing, mermaid validation, log writes) attach to the
+  current span through a context variable, so concurrent requests never mix.
+- Spans outside a trace (benchmarks, render workers) are not recorded.
+- Finished traces are kept in memory (for /api/debug/traces) and appended to a JSONL
+  file in OTLP/JSON format, one trace per line (readable by the collector's
+  `otlpjsonfile` receiver). File writes happen on a background thread, and the file is
+  rotated to `traces.jsonl.1` once it exceeds its size cap.
+
+Usage (break down slow requests after the fact):
+    python tracing.py                        # slowest 5 traces in logs/traces.jsonl
+    python tracing.py --slowest 10
+    python tracing.py --trace <trace_id>
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+TRACEPARENT_PATTERN = re.compile(r'00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}')
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER = 1, 2
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+# 1. Spans
+class Span:
+    """
+    One timed operation within a trace
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: str = "", attributes: dict | None = None,
+                 kind: int = SPAN_KIND_INTERNAL, root: "Span | None" = None):
+        self.name = name
+        self.root = root or self  # local root span (one per request), whose end exports the spans under it
+        self.exported = False
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes or {})
+        self.events: list[tuple[int, str, dict]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes):
+        self.events.append((time.time_ns(), name, attributes))
+
+    def record_exception(self, error: Exception):
+        self.add_event("exception", **{"exception.type": type(error).__name__, "exception.message": str(error)})
+        self.status, self.status_message = STATUS_ERROR, str(error)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [
+                {"timeUnixNano": str(ts), "name": name, "attributes": _otlp_attributes(attrs)}
+                for ts, name, attrs in self.events
+            ],
+            "status": {"code": self.status, "message": self.status_message} if self.status_message else {"code": self.status},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+class _NonRecordingSpan:
+    """
+    Stand-in yielded when there is no active trace; every method is a no-op
+    """
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_attributes(self, attributes: dict):
+        pass
+
+    def add_event(self, name: str, **attributes):
+        pass
+
+    def record_exception(self, error: Exception):
+        pass
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+def current_span() -> "Span | _NonRecordingSpan":
+    return _current_span.get() or NON_RECORDING_SPAN
+
+def current_trace_id() -> str | None:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+# 2. Exporters
+class InMemorySpanExporter:
+    """
+    Keeps the most recent finished traces (trace_id -> OTLP spans)
+    """
+
+    def __init__(self, max_traces: int = 200):
+        self.max_traces = max_traces
+        self._traces: OrderedDict[str, list[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, trace_id: str, spans: list[dict], resource: dict):
+        with self._lock:
+            self._traces[trace_id] = self._traces.get(trace_id, []) + spans
+            self._traces.move_to_end(trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def get_trace(self, trace_id: str) -> list[dict] | None:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def trace_ids(self) -> list[str]:
+        with self._lock:
+            return list(self._traces)
+
+class JsonlSpanExporter:
+    """
+    Appends each finished trace to a JSONL file as an OTLP/JSON ExportTraceServiceRequest.
+    export() only queues the trace; a writer thread does the file I/O off the request path.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 50 * 1024 * 1024, max_queue: int = 1000):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._writer = threading.Thread(target=self._write_loop, name="trace-export", daemon=True)
+        self._writer.start()
+
+    def export(self, trace_id: str, spans: list[dict], resource: dict):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes(resource)},
+                "scopeSpans": [{"scope": {"name": "techstack.backend"}, "spans": spans}],
+            }]
+        }
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            print(f"Trace export queue full, dropped trace {trace_id}")
+
+    def _write_loop(self):
+        while True:
+            payload = self._queue.get()
+            try:
+                if payload is None:
+                    return
+                self._rotate()
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(payload) + "\n")
+            except Exception as e:
+                print(f"Trace export error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _rotate(self):
+        """
+        Keeps one previous file (traces.jsonl.1) once the current one exceeds max_bytes
+        """
+        if self.max_bytes and self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+            os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+
+    def shutdown(self):
+        """
+        Writes the queued traces and stops the writer thread
+        """
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+# 3. Tracer
+class Tracer:
+    """
+    Creates spans and hands finished traces to the exporters
+    """
+
+    def __init__(self, service_name: str = "techstack-backend", exporters: list | None = None):
+        self.resource = {"service.name": service_name}
+        self.exporters = list(exporters or [])
+        self._pending: dict[str, list[Span]] = {}  # root span_id -> finished spans awaiting their root
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def _activate(self, span: Span, is_root: bool):
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._finish(span, is_root)
+
+    @contextmanager
+    def start_trace(self, name: str, traceparent: str | None = None, **attributes):
+        """
+        Root span of a request. Continues the caller's trace if a valid traceparent is given.
+        """
+        match = TRACEPARENT_PATTERN.fullmatch((traceparent or "").strip().lower())
+        if match and match.group(1) != "0" * 32:
+            span = Span(name, match.group(1), match.group(2), attributes, kind=SPAN_KIND_SERVER)
+        else:
+            span = Span(name, secrets.token_hex(16), "", attributes, kind=SPAN_KIND_SERVER)
+        with self._activate(span, is_root=True):
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Child span of the current span; a no-op when no trace is active
+        """
+        parent = _current_span.get()
+        if parent is None:
+            yield NON_RECORDING_SPAN
+            return
+        with self._activate(Span(name, parent.trace_id, parent.span_id, attributes, root=parent.root), is_root=False) as span:
+            yield span
+
+    def _finish(self, span: Span, is_root: bool):
+        """
+        Spans are grouped by their local root, not the trace ID, which a client may reuse across
+        requests. A span that ends after its root (e.g. a task that outlived the request) is
+        exported on its own instead of waiting for a root that already left.
+        """
+        root_id = span.root.span_id
+        with self._lock:
+            if span.root.exported:
+                spans = [span]
+            else:
+                self._pending.setdefault(root_id, []).append(span)
+                if not is_root:
+                    return
+                span.exported = True
+                spans = self._pending.pop(root_id)
+        otlp_spans = [s.to_otlp() for s in spans]
+        for exporter in self.exporters:
+            exporter.export(span.trace_id, otlp_spans, self.resource)
+
+# Process-wide tracer; exporters are attached by the application at startup
+tracer = Tracer()
+
+# 4. Trace Breakdown CLI
+def load_traces(path: Path) -> dict[str, list[dict]]:
+    traces: dict[str, list[dict]] = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                payload = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            for resource_spans in payload.get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        traces.setdefault(span["traceId"], []).append(span)
+    return traces
+
+def span_duration_ms(span: dict) -> float:
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+
+def format_trace(spans: list[dict]) -> str:
+    """
+    Indented span tree with durations and offsets from the start of the trace
+    """
+    span_ids = {span["spanId"] for span in spans}
+    children: dict[str, list[dict]] = {}
+    roots = []
+    for span in spans:
+        parent = span.get("parentSpanId")
+        if parent in span_ids:
+            children.setdefault(parent, []).append(span)
+        else:
+            roots.append(span)
+    trace_start = min(int(span["startTimeUnixNano"]) for span in spans)
+
+    lines = []
+    def visit(span: dict, depth: int):
+        offset = (int(span["startTimeUnixNano"]) - trace_start) / 1e6
+        attributes = " ".join(
+            f"{attr['key']}={next(iter(attr['value'].values()))}" for attr in span.get("attributes", [])
+        )
+        error = " ERROR" if span.get("status", {}).get("code") == STATUS_ERROR else ""
+        lines.append(f"{'  ' * depth}{span['name']:<{40 - 2 * depth}} {span_duration_ms(span):>9.1f}ms  @{offset:>8.1f}ms{error}  {attributes}")
+        for child in sorted(children.get(span["spanId"], []), key=lambda s: int(s["startTimeUnixNano"])):
+            visit(child, depth + 1)
+    for root in sorted(roots, key=lambda s: int(s["startTimeUnixNano"])):
+        visit(root, 0)
+    return "\n".join(lines)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Break down recorded request traces")
+    parser.add_argument("path", nargs="?", type=Path, default=Path("logs") / "traces.jsonl")
+    parser.add_argument("--slowest", type=int, default=5, help="Show the N slowest traces")
+    parser.add_argument("--trace", help="Show a single trace by ID")
+    args = parser.parse_args(argv)
+
+    if not args.path.exists():
+        print(f"No trace file at {args.path}", file=sys.stderr)
+        return 1
+    traces = load_traces(args.path)
+    if args.trace:
+        if args.trace not in traces:
+            print(f"Trace {args.trace} not found", file=sys.stderr)
+            return 1
+        selected = [args.trace]
+    else:
+        def trace_duration(trace_id: str) -> float:
+            spans = traces[trace_id]
+            return (max(int(s["endTimeUnixNano"]) for s in spans) - min(int(s["startTimeUnixNano"]) for s in spans)) / 1e6
+        selected = sorted(traces, key=trace_duration, reverse=True)[: args.slowest]
+
+    for trace_id in selected:
+        print(f"=== trace {trace_id} ===")
+        print(format_trace(traces[trace_id]))
+        print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
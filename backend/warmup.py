@@ -0,0 +1,148 @@
+"""
+Speculative Pre-generation (Cache Warm-up)
+
+Mines the stack recommendation log for the most popular input combinations and
+pre-generates their recommendations during off-peak hours, within a token budget
+per off-peak window. Entries generated with an older prompt version are refreshed.
+"""
+import asyncio
+import json
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from recommendation_cache import RecommendationCache, normalize_inputs, request_cache_key
+
+# Generator signature: inputs -> (parsed response as dict, tokens used, generated custom prompt)
+GenerateFn = Callable[[dict], Awaitable[tuple[dict, int, str]]]
+
+def mine_popular_requests(log_file: Path, top_n: int) -> list[dict]:
+    """
+    Stream the recommendation log and return the top-N most frequent input combinations.
+    Requests with free-text custom constraints are skipped since they rarely repeat.
+    """
+    counts = Counter()
+    examples = {}
+    if not log_file.exists():
+        return []
+    with open(log_file) as f:
+        for line in f:
+            try:
+                inputs = json.loads(line).get("inputs") or {}
+            except json.JSONDecodeError:
+                continue
+            normalized = normalize_inputs(inputs)
+            if normalized["customConstraints"] or not normalized["appType"]:
+                continue
+            key = request_cache_key(normalized)
+            counts[key] += 1
+            # Keep the original spelling of the first request seen for this combination
+            examples.setdefault(key, inputs)
+    return [examples[key] for key, _ in counts.most_common(top_n)]
+
+def parse_hour_window(window: str) -> tuple[int, int]:
+    """
+    Parse an "START-END" hour window like "1-6" (END exclusive, may wrap midnight)
+    """
+    start, end = window.split("-")
+    return int(start) % 24, int(end) % 24
+
+def is_off_peak(now: datetime, window: tuple[int, int]) -> bool:
+    start, end = window
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+class WarmupScheduler:
+    """
+    Background task that keeps the cache warm for popular requests
+    """
+
+    def __init__(self, cache: RecommendationCache, generate: GenerateFn, log_file: Path,
+                 prompt_version: str, top_n: int = 20, token_budget: int = 200000,
+                 off_peak_window: str = "1-6", interval_seconds: int = 900, retriever=None):
+        self.cache = cache
+        self.generate = generate
+        self.retriever = retriever  # SimilarityRetriever to index pre-generated entries in (optional)
+        self.log_file = log_file
+        self.prompt_version = prompt_version
+        self.top_n = top_n
+        self.token_budget = token_budget
+        self.off_peak_window = parse_hour_window(off_peak_window)
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+        # Budget is tracked per off-peak window (keyed by the window's start date)
+        self._window_id: str | None = None
+        self._tokens_spent = 0
+
+    def _current_window_id(self, now: datetime) -> str:
+        start, end = self.off_peak_window
+        date = now.date()
+        # A window wrapping midnight belongs to the day it started
+        if start > end and now.hour < end:
+            date = date.fromordinal(date.toordinal() - 1)
+        return f"{date.isoformat()}@{start}"
+
+    async def run_once(self, now: datetime | None = None) -> dict:
+        """
+        Pre-generate missing or stale entries for the current popular requests.
+        Returns a summary of what was done.
+        """
+        now = now or datetime.now()
+        window_id = self._current_window_id(now)
+        if window_id != self._window_id:
+            self._window_id = window_id
+            self._tokens_spent = 0
+
+        summary = {"candidates": 0, "generated": 0, "skipped_fresh": 0, "failed": 0, "tokens_spent": self._tokens_spent}
+        candidates = mine_popular_requests(self.log_file, self.top_n)
+        summary["candidates"] = len(candidates)
+
+        for inputs in candidates:
+            if self._tokens_spent >= self.token_budget:
+                print(f"=== WARMUP: Token budget exhausted ({self._tokens_spent}/{self.token_budget}) ===")
+                break
+            key = request_cache_key(inputs)
+            if self.cache.is_fresh(key, self.prompt_version):
+                summary["skipped_fresh"] += 1
+                continue
+            try:
+                response, tokens, custom_prompt = await self.generate(inputs)
+            except Exception as e:
+                print(f"=== WARMUP: Generation failed for {key}: {e} ===")
+                summary["failed"] += 1
+                continue
+            self._tokens_spent += tokens
+            self.cache.set(key, self.prompt_version, inputs, response, tokens=tokens, source="warmup",
+                           custom_prompt=custom_prompt)
+            if self.retriever is not None:
+                self.retriever.add(key, inputs)
+            summary["generated"] += 1
+            print(f"=== WARMUP: Pre-generated {key} ({tokens} tokens) ===")
+
+        summary["tokens_spent"] = self._tokens_spent
+        return summary
+
+    async def _loop(self):
+        while True:
+            try:
+                if is_off_peak(datetime.now(), self.off_peak_window):
+                    summary = await self.run_once()
+                    print(f"=== WARMUP: {summary} ===")
+            except Exception as e:
+                print(f"=== WARMUP: Error: {e} ===")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
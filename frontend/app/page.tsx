@@ -37,6 +37,15 @@ const OPTIONS = {
   ]
 };
 
+// W3C trace context header, so backend spans for a request share the trace ID logged here
+const randomHex = (bytes: number) =>
+  Array.from(crypto.getRandomValues(new Uint8Array(bytes)), b => b.toString(16).padStart(2, '0')).join('');
+
+const createTraceparent = () => {
+  const traceId = randomHex(16);
+  return { traceId, traceparent: `00-${traceId}-${randomHex(8)}-01` };
+};
+
 export default function Home() {
   const [appType, setAppType] = useState<string[]>([]);
   const [scale, setScale] = useState<string[]>([]);
@@ -221,11 +230,12 @@ export default function Home() {
     setResult('');
     setTechStackData(null);
 
+    const { traceId, traceparent } = createTraceparent();
     try {
       const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
       const response = await fetch(`${apiUrl}/api/recommend`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', traceparent },
         body: JSON.stringify({
           appType: appType.join(', '),
           scale: scale.join(', '),
@@ -243,7 +253,7 @@ export default function Home() {
       }
 
       const data = await response.json();
-      console.log('API Response:', data);
+      console.log('API Response:', data, 'Trace ID:', traceId);
 
       // The response is now already structured
       const finalData = {
@@ -267,7 +277,7 @@ export default function Home() {
       console.log('Final data:', finalData);
 
     } catch (error) {
-      console.error("Error fetching stack:", error);
+      console.error("Error fetching stack:", error, "Trace ID:", traceId);
       setResult("❌ Connection Failed. Make sure Backend is running!");
     } finally {
       setLoading(false);
@@ -7,6 +7,7 @@ import { useState } from 'react';
 interface TechItem {
   name: string;
   icon?: string;
+  logo?: string;
   pros: string[];
   cons: string[];
   why: string;
@@ -33,8 +34,9 @@ export default function TechStackDisplay({
 }: TechStackDisplayProps) {
   const [failedImages, setFailedImages] = useState<Set<string>>(new Set());
 
-  const getTechDisplay = (techName: string, fallbackIcon: string | undefined) => {
-    const logo = getTechLogo(techName);
+  const getTechDisplay = (techName: string, fallbackIcon: string | undefined, logoKey?: string) => {
+    // Prefer the canonical logo key resolved by the backend knowledge base
+    const logo = getTechLogo(logoKey || techName);
     
     // First try the fallback icon from response
     if (fallbackIcon && fallbackIcon.length > 0) {
@@ -87,7 +89,7 @@ export default function TechStackDisplay({
               {/* Header */}
               <div className="flex items-start gap-4 mb-4">
                 <div className="flex items-center justify-center w-10 h-10 flex-shrink-0 rounded-lg bg-white border border-gray-300 shadow-sm">
-                  {getTechDisplay(tech.name, tech.icon)}
+                  {getTechDisplay(tech.name, tech.icon, tech.logo)}
                 </div>
                 <div className="flex-1">
                   <h3 className="text-base font-semibold text-gray-900">{tech.name}</h3>
@@ -1,6 +1,7 @@
 export interface TechItem {
   name: string;
   icon?: string;
+  logo?: string;
   pros: string[];
   cons: string[];
   why: string;